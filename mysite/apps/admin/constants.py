@@ -5,4 +5,10 @@ SHOW_HOTNEWS_COUNT = 3
 PER_PAGE_NEWS_COUNT = 10
 
 # 显示轮播图数量
-SHOW_BANNER_COUNT = 6
\ No newline at end of file
+SHOW_BANNER_COUNT = 6
+
+# 异步上传任务信息有效期，单位秒
+UPLOAD_JOB_EXPIRES = 24 * 60 * 60
+
+# 暂存文件超过该时间且任务已结束或已过期时，由定时任务删除，单位秒
+UPLOAD_SPOOL_STALE_AGE = 60 * 60
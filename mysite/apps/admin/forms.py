@@ -1,6 +1,8 @@
 from django import forms
 
 from doc.models import Doc
+from doc.constants import DOC_CONTENT_TYPES
+from doc.files import resolve_content_type
 from news.models import News, Tag
 from course.models import Course
 
@@ -44,6 +46,13 @@ class DocsPubForm(forms.ModelForm):
     file_url = forms.URLField(label='文档url',
                                error_messages={"required": "文档url不能为空"})
 
+    def clean_file_url(self):
+        # 发布时拒绝不能下载的文档格式
+        file_url = self.cleaned_data.get('file_url')
+        if not resolve_content_type(file_url):
+            raise forms.ValidationError('不支持的文档格式，支持：{}'.format('/'.join(DOC_CONTENT_TYPES)))
+        return file_url
+
     class Meta:
         model = Doc  # 与数据库模型关联
         # 需要关联的字段
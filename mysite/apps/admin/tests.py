@@ -1,3 +1,86 @@
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django_redis import get_redis_connection
+
+from utils.fastdfs import fdfs
+
+
+class UploadDedupTest(TestCase):
+    """
+    上传文件登记表，fastdfs客户端使用mock
+    """
+
+    def setUp(self):
+        get_redis_connection('default').flushall()
+        self.client_mock = mock.Mock()
+        self.client_mock.upload_by_buffer.side_effect = self.fake_upload
+        self.client_mock.file_exists.return_value = True
+        patcher = mock.patch.object(fdfs, 'get_fdfs_client', return_value=self.client_mock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.uploaded = 0
+
+    def fake_upload(self, buffer, file_ext_name=None):
+        self.uploaded += 1
+        return {'Status': 'Upload successed.', 'Remote file_id': 'group1/M00/00/00/f{}.{}'.format(
+            self.uploaded, file_ext_name)}
+
+    def upload(self, content=b'hello', ext='txt'):
+        return fdfs.upload_file(SimpleUploadedFile('a.{}'.format(ext), content), file_ext_name=ext)
+
+    def test_duplicate(self):
+        first = self.upload()
+        second = self.upload()
+        self.assertEqual(second['Remote file_id'], first['Remote file_id'])
+        self.assertTrue(second['Duplicate'])
+        self.assertEqual(self.uploaded, 1)
+        # 拓展名或内容不同时分开上传
+        self.assertNotEqual(self.upload(ext='md')['Remote file_id'], first['Remote file_id'])
+        self.assertNotEqual(self.upload(b'world')['Remote file_id'], first['Remote file_id'])
+        self.assertEqual(self.uploaded, 3)
+
+    def test_delete_file(self):
+        first = self.upload()
+        other = self.upload(b'world')
+        fdfs.delete_file(first['Remote file_id'])
+        self.client_mock.delete_file.assert_called_once_with(first['Remote file_id'].encode())
+        con_redis = get_redis_connection('default')
+        self.assertEqual(con_redis.hlen(fdfs.FDFS_UPLOAD_REGISTRY_KEY), 1)
+        self.assertEqual(con_redis.hlen(fdfs.FDFS_UPLOAD_REGISTRY_FILES_KEY), 1)
+        # 删除后再上传相同文件是新文件，其它文件的登记不受影响
+        again = self.upload()
+        self.assertNotEqual(again['Remote file_id'], first['Remote file_id'])
+        self.assertNotIn('Duplicate', again)
+        self.assertTrue(self.upload(b'world')['Duplicate'])
+        self.assertEqual(self.upload(b'world')['Remote file_id'], other['Remote file_id'])
+
+    def test_registered_file_missing(self):
+        first = self.upload()
+        # 文件已经不在fastdfs中（例如直接在服务器上删除）
+        self.client_mock.file_exists.return_value = False
+        second = self.upload()
+        self.assertNotEqual(second['Remote file_id'], first['Remote file_id'])
+        self.assertEqual(self.uploaded, 2)
+        self.client_mock.file_exists.return_value = True
+        self.assertEqual(self.upload()['Remote file_id'], second['Remote file_id'])
+
+    def test_concurrent_upload(self):
+        con_redis = get_redis_connection('default')
+        field = fdfs._registry_field(fdfs.get_file_sha256(SimpleUploadedFile('a.txt', b'hello')), 'txt')
+        hget = con_redis.hget
+
+        # 检查登记表之后、登记之前，其它进程登记了相同的文件
+        def hget_then_register(key, name):
+            value = hget(key, name)
+            if key == fdfs.FDFS_UPLOAD_REGISTRY_KEY:
+                con_redis.hset(key, name, 'group1/M00/00/00/other.txt')
+            return value
 
-# Create your tests here.
+        with mock.patch('utils.fastdfs.fdfs.get_redis_connection', return_value=con_redis), \
+                mock.patch.object(con_redis, 'hget', side_effect=hget_then_register):
+            res = self.upload()
+        self.assertEqual(res['Remote file_id'], 'group1/M00/00/00/other.txt')
+        self.client_mock.delete_file.assert_called_once_with(b'group1/M00/00/00/f1.txt')
+        self.assertEqual(hget(fdfs.FDFS_UPLOAD_REGISTRY_KEY, field), b'group1/M00/00/00/other.txt')
@@ -0,0 +1,144 @@
+'''
+后台文件异步上传：请求中只把文件保存到本地暂存目录并提交celery任务 upload_spooled_file，
+由任务上传到fastdfs，上传进度和结果保存在redis hash中，前端通过 /admin/uploads/<job_id>/ 查询
+'''
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from news.images import schedule_image_variants
+from utils.fastdfs.fdfs import upload_file
+from .constants import UPLOAD_JOB_EXPIRES, UPLOAD_SPOOL_STALE_AGE
+
+logger = logging.getLogger('django')
+
+# 暂存目录需要web进程和celery worker都能访问
+spool_storage = FileSystemStorage(location=settings.UPLOAD_SPOOL_DIR)
+
+
+# 任务状态为pending时改为uploading，返回1，否则返回0
+# 同一个任务被重复投递、或者和提交失败后的同步上传同时执行时，只有一个能取得任务
+CLAIM_UPLOAD_JOB_SCRIPT = """
+if redis.call('hget', KEYS[1], 'status') == 'pending' then
+    redis.call('hset', KEYS[1], 'status', 'uploading')
+    return 1
+end
+return 0
+"""
+
+
+def get_upload_job_key(job_id):
+    return 'upload_job_{}'.format(job_id)
+
+
+def create_upload_job(file, file_ext_name, user_id, kind):
+    """
+    文件保存到暂存目录并提交上传任务
+    :param file: UploadedFile，临时文件直接移动到暂存目录
+    :param kind: image、doc，图片上传完成后生成缩略图
+    :return: 任务id
+    """
+    job_id = uuid.uuid4().hex
+    name = spool_storage.save('{}.{}'.format(job_id, file_ext_name), file)
+    key = get_upload_job_key(job_id)
+    con_redis = get_redis_connection('default')
+    pl = con_redis.pipeline()
+    pl.hset(key, mapping={
+        'status': 'pending',
+        'user_id': user_id,
+        'kind': kind,
+        'name': name,
+        'ext': file_ext_name,
+        'sha256': getattr(file, 'sha256', ''),
+        'size': file.size,
+        'uploaded': 0,
+    })
+    pl.expire(key, UPLOAD_JOB_EXPIRES)
+    pl.execute()
+
+    # 在函数中导入，避免django初始化时导入celery
+    from celery_tasks.upload import tasks as upload_tasks
+    try:
+        upload_tasks.upload_spooled_file.delay(job_id)
+    except Exception as e:
+        # 任务提交失败时在当前请求中上传
+        logger.error('提交上传任务异常：\n{}'.format(e))
+        process_upload_job(job_id)
+    return job_id
+
+
+def process_upload_job(job_id):
+    """
+    上传暂存目录中的文件，完成后删除暂存文件
+    """
+    key = get_upload_job_key(job_id)
+    con_redis = get_redis_connection('default')
+    if not con_redis.eval(CLAIM_UPLOAD_JOB_SCRIPT, 1, key):
+        return
+    job = get_upload_job(job_id)
+
+    def progress(uploaded):
+        con_redis.hset(key, 'uploaded', uploaded)
+
+    try:
+        with spool_storage.open(job['name']) as f:
+            file = File(f, name=job['name'])
+            if job['sha256']:
+                # 接收文件时已经计算
+                file.sha256 = job['sha256']
+            upload_res = upload_file(file, file_ext_name=job['ext'], progress=progress)
+        if upload_res.get('Status') != 'Upload successed.':
+            raise IOError('上传到FastDFS服务器失败：{}'.format(upload_res.get('Status')))
+        url = settings.FASTDFS_SERVER_DOMAIN + '/' + upload_res['Remote file_id']
+        con_redis.hset(key, mapping={'status': 'done', 'url': url, 'uploaded': job['size']})
+        if job['kind'] == 'image':
+            schedule_image_variants(url)
+    except Exception as e:
+        logger.error('文件上传出现异常：{}'.format(e))
+        con_redis.hset(key, mapping={'status': 'failed', 'errmsg': '文件上传到服务器失败'})
+    finally:
+        spool_storage.delete(job['name'])
+
+
+def get_upload_job(job_id):
+    """
+    :return: 上传任务信息，任务不存在或已过期时为None
+    """
+    job = get_redis_connection('default').hgetall(get_upload_job_key(job_id))
+    if not job:
+        return None
+    job = {k.decode(): v.decode() for k, v in job.items()}
+    for field in ('user_id', 'size', 'uploaded'):
+        job[field] = int(job[field])
+    return job
+
+
+def sweep_spool_files():
+    """
+    删除暂存目录中遗留的文件：超过UPLOAD_SPOOL_STALE_AGE秒，并且任务已结束或任务信息已过期
+    :return: 删除的文件数
+    """
+    if not os.path.isdir(settings.UPLOAD_SPOOL_DIR):
+        return 0
+    count = 0
+    now = timezone.now()
+    for name in spool_storage.listdir('')[1]:
+        try:
+            if (now - spool_storage.get_modified_time(name)).total_seconds() < UPLOAD_SPOOL_STALE_AGE:
+                continue
+            # 暂存文件名为 任务id.后缀
+            job = get_upload_job(os.path.splitext(name)[0])
+            if job and job['status'] in ('pending', 'uploading'):
+                continue
+            spool_storage.delete(name)
+            count += 1
+        except OSError as e:
+            # 文件已被上传任务删除
+            logger.info('暂存文件{}清理异常：{}'.format(name, e))
+    return count
@@ -4,6 +4,7 @@ from . import views
 app_name = 'admin'
 urlpatterns = [
     path ('',views.IndexView.as_view(),name='index'),
+    path ('cache/stats/',views.CacheStatsView.as_view(),name='cache_stats'),
     path ('tags/',views.TagManageView.as_view(),name='tags'),
     path ('tags/<int:tag_id>/',views.TagEditView.as_view(),name='tag_edit'),
     path ('hotnews/',views.HotNewsManageView.as_view(),name='hotnews'),
@@ -21,6 +22,7 @@ urlpatterns = [
     path('docs/<int:doc_id>/', views.DocsEditView.as_view(), name='docs_edit'),
     path('docs/pub/', views.DocsPubView.as_view(), name='docs_pub'),
     path('docs/files/', views.DocsUploadFile.as_view(), name='upload_text'),
+    path('uploads/<str:job_id>/', views.UploadJobView.as_view(), name='upload_job'),
 
     path('courses/', views.CoursesManageView.as_view(), name='courses_manage'),
     path('courses/<int:course_id>/', views.CoursesEditView.as_view(), name='courses_edit'),
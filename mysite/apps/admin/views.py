@@ -24,14 +24,18 @@ from users.models import User
 from dj_web import settings
 from news import models
 from doc.models import Doc
+from doc.files import fill_doc_meta
+from news.images import schedule_image_variants
 from course.models import Course,Teacher,CourseCategory
 
 from utils import paginator_script
-from utils.fastdfs.fdfs import FDFS_Client
+from utils.cache_fun import get_cache_stats
+from utils.fastdfs.fdfs import upload_file, get_fdfs_client
 from utils.json_fun import to_json_data
 from utils.res_code import Code, error_map
 from utils.secrets import qiniu_secret_info
 from .constants import SHOW_HOTNEWS_COUNT, PER_PAGE_NEWS_COUNT,SHOW_BANNER_COUNT
+from .uploads import create_upload_job, get_upload_job
 from admin.forms import NewsPubForm, DocsPubForm, CoursesPubForm
 
 logger=logging.getLogger('django')
@@ -49,6 +53,22 @@ class IndexView(LoginRequiredMixin,View):
         return render(request,'403.html')
 
 
+class CacheStatsView(LoginRequiredMixin,View):
+    """
+    route: /admin/cache/stats/
+    缓存命中统计，fastdfs连接池统计（当前进程）
+    """
+    def get(self,request):
+        if not request.user.is_staff:
+            return to_json_data(errno=Code.ROLEERR, errmsg='没有操作权限')
+        try:
+            stats = get_cache_stats()
+        except Exception as e:
+            logger.error('缓存统计读取异常：\n{}'.format(e))
+            return to_json_data(errno=Code.DBERR, errmsg=error_map[Code.DBERR])
+        return to_json_data(data={'stats': stats, 'fdfs': get_fdfs_client().stats()})
+
+
 class TagManageView(PermissionRequiredMixin,View):
     """
     route: /admin/tags/
@@ -66,7 +86,7 @@ class TagManageView(PermissionRequiredMixin,View):
 
     def get(self,request):
         # annotate分组查询,values指定输出字典格式,Count统计数量
-        tags = models.Tag.objects.values('id','name').annotate(num_news = Count('news__tag_id')).filter(is_delete=False).\
+        tags = models.Tag.objects.values('id','name','is_searchable').annotate(num_news = Count('news__tag_id')).filter(is_delete=False).\
             order_by('-num_news','update_time')
         return render(request,'admin/news/tag_manage.html',locals())
 
@@ -121,8 +141,18 @@ class TagEditView(PermissionRequiredMixin,View):
         dict_data = json.loads(json_data.decode('utf8'))
 
         tag_name = dict_data.get('name')
-        tag = models.Tag.objects.only('name').filter(id=tag_id).first()
+        # 是否可搜索，修改后标签下的文章由信号处理函数批量更新索引
+        is_searchable = dict_data.get('is_searchable')
+        tag = models.Tag.objects.only('name','is_searchable').filter(id=tag_id).first()
         if tag:
+            if is_searchable is not None:
+                if not isinstance(is_searchable, bool):
+                    return to_json_data(errno=Code.PARAMERR, errmsg='参数is_searchable错误!')
+                if is_searchable != tag.is_searchable:
+                    tag.is_searchable = is_searchable
+                    tag.save(update_fields=['is_searchable','update_time'])
+                if not tag_name:
+                    return to_json_data(errmsg='标签更新成功!')
             if tag_name:
                 tag_name = tag_name.strip()
                 if not models.Tag.objects.only('id').filter(name=tag_name).exists():
@@ -269,7 +299,7 @@ class NewsManageView(PermissionRequiredMixin,View):
         # 没有传参时返回的信息
         tag=models.Tag.objects.only('id','name').filter(is_delete=False)
         news=models.News.objects.select_related('author','tag').\
-            only('title','author__username','tag__name','update_time').filter(is_delete=False)
+            only('title','author__username','tag__name','update_time','comment_count').filter(is_delete=False)
 
         # 通过时间进行过滤
         try:
@@ -423,9 +453,20 @@ class NewsUploadImage(View):
         except Exception as e:
             logger.info ('图片拓展名异常：{}'.format (e))
             image_ext_name = 'jpg'
+        # 异步上传：文件暂存后返回任务id，由前端查询上传结果
+        if request.POST.get ('async'):
+            # 上传任务属于提交的用户，只有本人能查询，需要登录
+            if not request.user.is_authenticated:
+                return to_json_data (errno=Code.SESSIONERR, errmsg=error_map[Code.SESSIONERR])
+            try:
+                job_id = create_upload_job (image_file, image_ext_name, request.user.id, 'image')
+            except Exception as e:
+                logger.error ('图片暂存出现异常：{}'.format (e))
+                return to_json_data (errno=Code.UNKOWNERR, errmsg='图片上传异常')
+            return to_json_data (data={'job_id': job_id}, errmsg='图片已提交上传')
         # 文件上传
         try:
-            upload_res = FDFS_Client.upload_by_buffer (image_file.read (), file_ext_name=image_ext_name)
+            upload_res = upload_file (image_file, file_ext_name=image_ext_name)
         except Exception as e:
             logger.error ('图片上传出现异常：{}'.format (e))
             return to_json_data (errno=Code.UNKOWNERR, errmsg='图片上传异常')
@@ -436,6 +477,8 @@ class NewsUploadImage(View):
             else:
                 image_name = upload_res.get ('Remote file_id')
                 image_url = settings.FASTDFS_SERVER_DOMAIN + '/' + image_name
+                # 新闻缩略图、轮播图在后台生成列表和轮播图尺寸的缩略图
+                schedule_image_variants (image_url)
                 return to_json_data (data={'image_url': image_url}, errmsg='图片上传成功')
 
 
@@ -474,7 +517,7 @@ class MarkDownUploadImage(View):
             image_ext_name = 'jpg'
 
         try:
-            upload_res = FDFS_Client.upload_by_buffer(image_file.read(), file_ext_name=image_ext_name)
+            upload_res = upload_file(image_file, file_ext_name=image_ext_name)
         except Exception as e:
             logger.error('图片上传出现异常：{}'.format(e))
             return JsonResponse({'success': 0, 'message': '图片上传异常'})
@@ -603,8 +646,12 @@ class DocsEditView(PermissionRequiredMixin,View):
         dict_data = json.loads (json_data.decode ('utf8'))
         form = DocsPubForm (data=dict_data)
         if form.is_valid ():
+            file_url = doc.file_url
             for attr, value in form.cleaned_data.items ():
                 setattr (doc, attr, value)
+            if doc.file_url != file_url or not doc.file_name:
+                # 文件变化时重新计算下载信息
+                fill_doc_meta (doc)
             doc.save ()
             return to_json_data (errmsg='文档更新成功')
         else:
@@ -643,8 +690,17 @@ class DocsUploadFile(PermissionRequiredMixin,View):
             logger.info ('文件拓展名异常：{}'.format (e))
             text_ext_name = 'pdf'
 
+        # 异步上传：文件暂存后返回任务id，由前端查询上传结果
+        if request.POST.get ('async'):
+            try:
+                job_id = create_upload_job (text_file, text_ext_name, request.user.id, 'doc')
+            except Exception as e:
+                logger.error ('文件暂存出现异常：{}'.format (e))
+                return to_json_data (errno=Code.UNKOWNERR, errmsg='文件上传异常')
+            return to_json_data (data={'job_id': job_id}, errmsg='文件已提交上传')
+
         try:
-            upload_res = FDFS_Client.upload_by_buffer (text_file.read (), file_ext_name=text_ext_name)
+            upload_res = upload_file (text_file, file_ext_name=text_ext_name)
         except Exception as e:
             logger.error ('文件上传出现异常：{}'.format (e))
             return to_json_data (errno=Code.UNKOWNERR, errmsg='文件上传异常')
@@ -658,6 +714,30 @@ class DocsUploadFile(PermissionRequiredMixin,View):
                 return to_json_data (data={'text_file': text_url}, errmsg='文件上传成功')
 
 
+class UploadJobView(LoginRequiredMixin,View):
+    """
+    route: /admin/uploads/<job_id>/
+    异步上传的进度和结果
+    """
+    def get(self, request, job_id):
+        try:
+            job = get_upload_job (job_id)
+        except Exception as e:
+            logger.error ('上传任务读取异常：\n{}'.format (e))
+            return to_json_data (errno=Code.DBERR, errmsg=error_map[Code.DBERR])
+        if not job or job['user_id'] != request.user.id:
+            return to_json_data (errno=Code.NODATA, errmsg='上传任务不存在')
+        return to_json_data (data={
+            # pending、uploading、done、failed
+            'status': job['status'],
+            'size': job['size'],
+            'uploaded': job['uploaded'],
+            'progress': int (job['uploaded'] * 100 / job['size']) if job['size'] else 100,
+            'url': job.get ('url', ''),
+            'errmsg': job.get ('errmsg', ''),
+        })
+
+
 class DocsPubView(PermissionRequiredMixin,View):
     """
     /admin/docs/pub/
@@ -684,6 +764,8 @@ class DocsPubView(PermissionRequiredMixin,View):
         if form.is_valid():
             doc_instance = form.save(commit=False)
             doc_instance.author = request.user
+            # 计算下载时使用的文件信息
+            fill_doc_meta(doc_instance)
             doc_instance.save()
             return to_json_data(errmsg='文档创建成功')
         else:
@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class DocConfig(AppConfig):
-    name = 'apps.doc'
+    name = 'doc'
+
+    def ready(self):
+        # 注册信号处理函数
+        from doc import signals
@@ -0,0 +1,40 @@
+'''
+文档下载信息缓存，每个文档一个版本号，文档修改或删除时由signals中的信号处理函数把版本号加一
+'''
+from functools import partial
+
+from utils.cache_fun import get_or_set_versioned
+from doc.models import Doc
+from .constants import DOC_META_CACHE_EXPIRES
+from .files import fill_doc_meta, build_content_disposition
+
+DOC_META_FIELDS = ('file_url', 'content_type', 'file_size', 'etag', 'file_name')
+
+
+def get_doc_meta_version_key(doc_id):
+    return 'doc_meta_version_{}'.format(doc_id)
+
+
+def _build_doc_meta(doc_id):
+    doc = Doc.objects.only(*DOC_META_FIELDS).filter(is_delete=False, id=doc_id).first()
+    if not doc:
+        # 不存在的文档也缓存起来，避免重复查询
+        return {}
+    if not doc.file_name:
+        # 增加字段之前发布的文档，第一次下载时补全并保存
+        fill_doc_meta(doc)
+        Doc.objects.filter(id=doc.id).update(**{name: getattr(doc, name) for name in DOC_META_FIELDS[1:]})
+    else:
+        doc.content_disposition = build_content_disposition(doc.file_name)
+    meta = {name: getattr(doc, name) for name in DOC_META_FIELDS}
+    # 下载时直接使用的响应头
+    meta['content_disposition'] = doc.content_disposition
+    return meta
+
+
+def get_doc_meta(doc_id):
+    """
+    :return: 文档下载信息字典，文档不存在时为空字典
+    """
+    return get_or_set_versioned('doc_meta_{}'.format(doc_id), get_doc_meta_version_key(doc_id),
+                                partial(_build_doc_meta, doc_id), DOC_META_CACHE_EXPIRES, stat_name='doc_meta')
@@ -0,0 +1,34 @@
+# 请求fastdfs的连接超时和读取超时，单位秒
+DOC_DOWNLOAD_CONNECT_TIMEOUT = 3
+DOC_DOWNLOAD_READ_TIMEOUT = 30
+
+# 连接池大小，和uwsgi的线程数相当即可
+DOC_DOWNLOAD_POOL_SIZE = 10
+
+# 文档下载每次读取和返回的字节数
+DOC_DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# 转发给fastdfs的请求头，用于断点续传和协商缓存
+DOC_DOWNLOAD_FORWARD_HEADERS = ('Range', 'If-Range', 'If-None-Match', 'If-Modified-Since')
+
+# fastdfs响应中原样返回给浏览器的响应头
+DOC_DOWNLOAD_PASS_HEADERS = ('Content-Length', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified',
+                             'Content-Encoding')
+
+# 支持的文档格式：后缀 -> Content-Type，发布文档时不在表中的格式会被拒绝
+# https://www.iana.org/assignments/media-types/media-types.xhtml
+DOC_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'zip': 'application/zip',
+    'doc': 'application/msword',
+    'xls': 'application/vnd.ms-excel',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'ppt': 'application/vnd.ms-powerpoint',
+    'pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+}
+
+# 发布文档时读取文件大小和ETag的超时时间，单位秒
+DOC_META_TIMEOUT = 3
+
+# 文档下载信息缓存有效期，单位秒
+DOC_META_CACHE_EXPIRES = 24 * 60 * 60
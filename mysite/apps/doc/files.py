@@ -0,0 +1,82 @@
+'''
+文档文件信息：下载时使用的Content-Type、文件大小、ETag、文件名在发布文档时计算一次
+'''
+import logging
+import posixpath
+from urllib.parse import unquote, urlparse
+
+import requests
+from django.conf import settings
+from django.utils.encoding import escape_uri_path
+from requests.adapters import HTTPAdapter
+
+from .constants import DOC_DOWNLOAD_POOL_SIZE, DOC_CONTENT_TYPES, DOC_META_TIMEOUT
+
+logger = logging.getLogger('django')
+
+
+def _build_http_session():
+    # 进程内共用的连接池，下载时复用和fastdfs之间的连接
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=DOC_DOWNLOAD_POOL_SIZE, pool_maxsize=DOC_DOWNLOAD_POOL_SIZE)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+http_session = _build_http_session()
+
+
+def is_fdfs_url(file_url):
+    """
+    :return: 是否为fastdfs上的文件，只有这些文件可以交给nginx返回
+    """
+    return file_url.startswith(settings.FASTDFS_SERVER_DOMAIN.rstrip('/') + '/')
+
+
+def get_file_name(file_url):
+    return posixpath.basename(unquote(urlparse(file_url).path))
+
+
+def build_content_disposition(file_name):
+    """
+    :return: 下载时的Content-Disposition响应头，attachment让浏览器开始下载
+    """
+    return "attachment; filename*=UTF-8''{}".format(escape_uri_path(file_name))
+
+
+def resolve_content_type(file_url):
+    """
+    :return: 文件后缀对应的Content-Type，不支持的格式返回None
+    """
+    ex_name = posixpath.splitext(get_file_name(file_url))[1].lstrip('.').lower()
+    return DOC_CONTENT_TYPES.get(ex_name)
+
+
+def fill_doc_meta(doc):
+    """
+    计算文档的下载信息，不保存
+    文件大小和ETag通过HEAD请求fastdfs获取，失败时留空，下载时使用fastdfs的响应头
+    """
+    doc.content_type = resolve_content_type(doc.file_url) or ''
+    # 保存原始文件名，下载时再编码，超长时保留后缀截断
+    file_name = get_file_name(doc.file_url)
+    max_length = doc._meta.get_field('file_name').max_length
+    if len(file_name) > max_length:
+        name, ex_name = posixpath.splitext(file_name)
+        file_name = name[:max_length - len(ex_name)] + ex_name
+    doc.file_name = file_name
+    # 不保存到数据库，和其他下载信息一起缓存
+    doc.content_disposition = build_content_disposition(file_name)
+    doc.file_size = 0
+    doc.etag = ''
+    try:
+        # 和下载时一样请求不压缩的文件，Content-Length为文件本身的大小
+        res = http_session.head(doc.file_url, headers={'Accept-Encoding': 'identity'}, timeout=DOC_META_TIMEOUT,
+                                allow_redirects=True)
+        if res.status_code == 200:
+            doc.file_size = int(res.headers.get('Content-Length') or 0)
+            doc.etag = res.headers.get('ETag', '')[:64]
+    except (requests.RequestException, ValueError) as e:
+        logger.info('获取文档文件信息异常：\n{}'.format(e))
+    return doc
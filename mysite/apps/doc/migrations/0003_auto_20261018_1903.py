@@ -0,0 +1,33 @@
+# Generated by Django 2.1.7 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doc', '0002_auto_20190521_1146'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doc',
+            name='content_type',
+            field=models.CharField(default='', help_text='文件类型', max_length=100, verbose_name='文件类型'),
+        ),
+        migrations.AddField(
+            model_name='doc',
+            name='etag',
+            field=models.CharField(default='', help_text='文件ETag', max_length=64, verbose_name='文件ETag'),
+        ),
+        migrations.AddField(
+            model_name='doc',
+            name='file_name',
+            field=models.CharField(default='', help_text='下载文件名', max_length=255, verbose_name='下载文件名'),
+        ),
+        migrations.AddField(
+            model_name='doc',
+            name='file_size',
+            field=models.BigIntegerField(default=0, help_text='文件大小', verbose_name='文件大小'),
+        ),
+    ]
@@ -13,6 +13,11 @@ class Doc(ModelBase):
     desc = models.TextField(verbose_name="文档描述", help_text="文档描述")
     image_url = models.URLField(default="", verbose_name="图片url", help_text="图片url")
     author = models.ForeignKey('users.User', on_delete=models.SET_NULL, null=True)
+    # 下载时使用的文件信息，发布文档时计算
+    content_type = models.CharField(max_length=100, default="", verbose_name="文件类型", help_text="文件类型")
+    file_size = models.BigIntegerField(default=0, verbose_name="文件大小", help_text="文件大小")
+    etag = models.CharField(max_length=64, default="", verbose_name="文件ETag", help_text="文件ETag")
+    file_name = models.CharField(max_length=255, default="", verbose_name="下载文件名", help_text="下载文件名")
 
     class Meta:
         db_table = "tb_docs"   # 指明数据库表名
@@ -0,0 +1,20 @@
+import logging
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from doc.models import Doc
+
+from utils.cache_fun import bump_cache_version
+from .caches import get_doc_meta_version_key
+
+logger = logging.getLogger('django')
+
+
+@receiver([post_save, post_delete], sender=Doc)
+def bump_doc_meta_cache_version(sender, instance, **kwargs):
+    # 文档修改或删除时下载信息缓存失效
+    try:
+        bump_cache_version(get_doc_meta_version_key(instance.id))
+    except Exception as e:
+        logger.error('文档缓存版本号更新异常：\n{}'.format(e))
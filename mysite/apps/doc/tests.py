@@ -1,3 +1,89 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django_redis import get_redis_connection
+
+from doc import files
+from doc.caches import get_doc_meta
+from doc.models import Doc
+
+
+def head_response(status_code=200, headers=None):
+    res = mock.Mock(status_code=status_code)
+    res.headers = headers or {}
+    return res
+
+
+class DocMetaTest(TestCase):
+    """
+    文档下载信息，HEAD请求fastdfs使用mock
+    """
+
+    def setUp(self):
+        get_redis_connection('default').flushall()
+        self.file_url = settings.FASTDFS_SERVER_DOMAIN + '/group1/M00/00/00/%E6%96%87%E6%A1%A3%201.pdf'
+        patcher = mock.patch.object(files.http_session, 'head', return_value=head_response(
+            headers={'Content-Length': '1024', 'ETag': '"abc"'}))
+        self.head = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_doc(self, **kwargs):
+        return Doc.objects.create(file_url=self.file_url, title='文档', desc='描述', **kwargs)
+
+    def test_fill_doc_meta(self):
+        doc = files.fill_doc_meta(Doc(file_url=self.file_url))
+        # 保存原始文件名，响应头中是编码后的文件名
+        self.assertEqual(doc.file_name, '文档 1.pdf')
+        self.assertEqual(doc.content_disposition,
+                         "attachment; filename*=UTF-8''%E6%96%87%E6%A1%A3%201.pdf")
+        self.assertEqual(doc.content_type, 'application/pdf')
+        self.assertEqual((doc.file_size, doc.etag), (1024, '"abc"'))
+        self.assertEqual(self.head.call_args[1]['headers'], {'Accept-Encoding': 'identity'})
+
+    def test_long_file_name(self):
+        doc = files.fill_doc_meta(Doc(file_url=settings.FASTDFS_SERVER_DOMAIN + '/{}.pdf'.format('a' * 300)))
+        self.assertEqual(len(doc.file_name), 255)
+        self.assertTrue(doc.file_name.endswith('a.pdf'))
+
+    def test_head_failed(self):
+        self.head.side_effect = requests.ConnectionError('refused')
+        doc = files.fill_doc_meta(Doc(file_url=self.file_url))
+        self.assertEqual((doc.file_size, doc.etag), (0, ''))
+        self.assertEqual(doc.file_name, '文档 1.pdf')
+
+    def test_get_doc_meta(self):
+        doc = self.create_doc()
+        # 没有下载信息的旧文档，第一次读取时补全并保存
+        meta = get_doc_meta(doc.id)
+        self.assertEqual(meta['file_name'], '文档 1.pdf')
+        self.assertEqual(meta['content_disposition'],
+                         "attachment; filename*=UTF-8''%E6%96%87%E6%A1%A3%201.pdf")
+        doc.refresh_from_db()
+        self.assertEqual((doc.file_name, doc.file_size), ('文档 1.pdf', 1024))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_doc_meta(doc.id), meta)
+        self.assertEqual(self.head.call_count, 1)
+
+    def test_doc_changed(self):
+        doc = self.create_doc(file_name='文档 1.pdf', content_type='application/pdf')
+        self.assertEqual(get_doc_meta(doc.id)['file_name'], '文档 1.pdf')
+        doc.file_name = '新文档.pdf'
+        doc.save()
+        self.assertEqual(get_doc_meta(doc.id)['content_disposition'],
+                         "attachment; filename*=UTF-8''%E6%96%B0%E6%96%87%E6%A1%A3.pdf")
+        doc.is_delete = True
+        doc.save()
+        self.assertEqual(get_doc_meta(doc.id), {})
+        self.head.assert_not_called()
+
+    @override_settings(DOC_DOWNLOAD_ACCEL_REDIRECT=True)
+    def test_download(self):
+        doc = self.create_doc()
+        res = self.client.get('/doc/{}/'.format(doc.id))
+        self.assertEqual(res['X-Accel-Redirect'],
+                         settings.DOC_DOWNLOAD_ACCEL_PREFIX + '/group1/M00/00/00/%E6%96%87%E6%A1%A3%201.pdf')
+        self.assertEqual(res['Content-Disposition'], "attachment; filename*=UTF-8''%E6%96%87%E6%A1%A3%201.pdf")
+        res = self.client.get('/doc/{}/'.format(doc.id), HTTP_IF_NONE_MATCH='"abc"')
+        self.assertEqual(res.status_code, 304)
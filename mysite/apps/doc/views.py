@@ -1,13 +1,18 @@
 import requests
 import logging
+from urllib.parse import urlparse
 
 from django.shortcuts import render
-from django.http import FileResponse, Http404
-from django.utils.encoding import escape_uri_path
+from django.http import StreamingHttpResponse, HttpResponse, HttpResponseNotModified, Http404
+from django.utils.http import parse_etags
 from django.views import View
 from django.conf import settings
 
 from .models import Doc
+from .constants import DOC_DOWNLOAD_CONNECT_TIMEOUT, DOC_DOWNLOAD_READ_TIMEOUT, DOC_DOWNLOAD_CHUNK_SIZE, \
+    DOC_DOWNLOAD_FORWARD_HEADERS, DOC_DOWNLOAD_PASS_HEADERS
+from .caches import get_doc_meta
+from .files import http_session, is_fdfs_url
 
 # 导入日志器
 logger = logging.getLogger ('django')
@@ -20,50 +25,78 @@ def doc_index(request):
     return render (request, 'doc/docDownload.html', locals ())
 
 
+def _iter_upstream(upstream):
+    # 浏览器断开或者读取完毕时关闭和fastdfs的连接
+    # 原样转发响应体，不解压，和转发的Content-Length、ETag、Content-Encoding保持一致
+    try:
+        for chunk in upstream.raw.stream (DOC_DOWNLOAD_CHUNK_SIZE, decode_content=False):
+            yield chunk
+    finally:
+        upstream.close ()
+
+
 class DocDownload (View):
     def get(self, request, doc_id):
-        # 获取文件地址
-        doc = Doc.objects.only ('file_url').filter (is_delete=False, id=doc_id).first ()
+        # 文档下载信息从缓存中读取，发布文档时已经计算好
+        doc = get_doc_meta (doc_id)
         if doc:
-            # 下载地址拼接
-            doc_url = doc.file_url
-            # doc_url = settings.SITE_DOMAIN_PORT + doc_url
+            doc_url = doc['file_url']
+            content_type = doc['content_type']
+            if not content_type:
+                raise Http404 ("文档格式不正确！")
+            # http1.1 中的规范
+            # 设置为inline，会直接打开
+            # attachment 浏览器会开始下载
+            # 缓存中已经是编码好的响应头
+            content_disposition = doc['content_disposition']
+
+            # 文件未修改时直接返回304，不再请求fastdfs
+            if_none_match = request.META.get ('HTTP_IF_NONE_MATCH')
+            if doc['etag'] and if_none_match and doc['etag'] in parse_etags (if_none_match):
+                res = HttpResponseNotModified ()
+                res['ETag'] = doc['etag']
+                return res
+
+            if settings.DOC_DOWNLOAD_ACCEL_REDIRECT and is_fdfs_url (doc_url):
+                # 文件内容由nginx从fastdfs读取后返回，响应头Content-Type、Content-Disposition会保留
+                # 其他地址的文件nginx中没有对应的location，仍然由下面的代码转发
+                res = HttpResponse (content_type=content_type)
+                res["X-Accel-Redirect"] = settings.DOC_DOWNLOAD_ACCEL_PREFIX + urlparse (doc_url).path
+                res["Content-Disposition"] = content_disposition
+                return res
+
+            # 断点续传和协商缓存的请求头转发给fastdfs
+            # requests默认请求gzip压缩，压缩后的长度、Range和发布时记录的ETag对不上，要求不压缩
+            headers = {'Accept-Encoding': 'identity'}
+            for name in DOC_DOWNLOAD_FORWARD_HEADERS:
+                value = request.META.get ('HTTP_' + name.upper ().replace ('-', '_'))
+                if value:
+                    headers[name] = value
             try:
                 # stream在下载大文件的时候可以提升下载速度
-                res = FileResponse(requests.get(doc_url, stream=True))
-            except Exception as e:
+                upstream = http_session.get (doc_url, headers=headers, stream=True,
+                                             timeout=(DOC_DOWNLOAD_CONNECT_TIMEOUT, DOC_DOWNLOAD_READ_TIMEOUT))
+            except requests.RequestException as e:
                 logger.info ("获取文档内容出现异常：\n{}".format (e))
                 raise Http404 ("文档下载异常！")
-            # 得到文件后缀
-            ex_name = doc_url.split ('.')[-1]
-            # https://stackoverflow.com/questions/23714383/what-are-all-the-possible-values-for-http-content-type-header
-            # http://www.iana.org/assignments/media-types/media-types.xhtml#image
-            if not ex_name:
-                raise Http404 ("文档url异常！")
-            else:
-                ex_name = ex_name.lower ()
 
-            if ex_name == "pdf":
-                res["Content-type"] = "application/pdf"
-            elif ex_name == "zip":
-                res["Content-type"] = "application/zip"
-            elif ex_name == "doc":
-                res["Content-type"] = "application/msword"
-            elif ex_name == "xls":
-                res["Content-type"] = "application/vnd.ms-excel"
-            elif ex_name == "docx":
-                res["Content-type"] = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-            elif ex_name == "ppt":
-                res["Content-type"] = "application/vnd.ms-powerpoint"
-            elif ex_name == "pptx":
-                res["Content-type"] = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+            if upstream.status_code in (304, 416):
+                # 文件未修改、请求范围错误，没有响应体
+                upstream.close ()
+                res = HttpResponse (status=upstream.status_code)
+            elif upstream.status_code in (200, 206):
+                res = StreamingHttpResponse (_iter_upstream (upstream), status=upstream.status_code,
+                                             content_type=content_type)
             else:
-                raise Http404 ("文档格式不正确！")
-            doc_filename = escape_uri_path (doc_url.split ('/')[-1])
-            # http1.1 中的规范
-            # 设置为inline，会直接打开
-            # attachment 浏览器会开始下载
-            res["Content-Disposition"] = "attachment; filename*=UTF-8''{}".format (doc_filename)
+                upstream.close ()
+                logger.info ("获取文档内容出现异常：\n状态码{}".format (upstream.status_code))
+                raise Http404 ("文档下载异常！")
+
+            for name in DOC_DOWNLOAD_PASS_HEADERS:
+                if name in upstream.headers:
+                    res[name] = upstream.headers[name]
+
+            res["Content-Disposition"] = content_disposition
             return res
         else:
-            raise Http404 ("文档不存在！")
\ No newline at end of file
+            raise Http404 ("文档不存在！")
@@ -1,5 +1,9 @@
 from django.apps import AppConfig
 
 
-class UsersConfig(AppConfig):
-    name = 'apps.news'
+class NewsConfig(AppConfig):
+    name = 'news'
+
+    def ready(self):
+        # 注册信号处理函数
+        from news import signals
@@ -0,0 +1,128 @@
+'''
+首页数据和新闻列表缓存，数据按版本号存放在default缓存中，
+标签、热门新闻、轮播图、新闻修改时由signals中的信号处理函数把版本号加一
+'''
+import time
+
+from django.template.loader import render_to_string
+
+from news import models
+
+from utils.cache_fun import get_or_set_versioned, bump_cache_version
+from .constants import SHOW_HOTNEWS_COUNT, SHOW_BANNER_COUNT, INDEX_CACHE_VERSION_KEY, INDEX_CACHE_EXPIRES, NEWS_ARTICLE_CACHE_EXPIRES
+from .images import get_image_variants, image_variant_urls
+
+
+def _build_index_tags():
+    # 只查询id和name字段
+    return list(models.Tag.objects.values('id', 'name').filter(is_delete=False))
+
+
+def _build_index_hot_news():
+    hot_news = models.HotNews.objects.select_related('news').only(
+        'news__title',
+        'news__image_url',
+        'news_id'
+    ).filter(is_delete=False).order_by('priority', '-news__clicks')[0:SHOW_HOTNEWS_COUNT]
+    hot_news = list(hot_news)
+    variants = get_image_variants(i.news.image_url for i in hot_news)
+    # 保持和模型对象相同的取值方式，模板中依然使用 i.news.title
+    return [
+        {
+            'news': dict({
+                'id': i.news_id,
+                'title': i.news.title,
+            }, **image_variant_urls(variants, i.news.image_url, 'thumb'))
+        }
+        for i in hot_news
+    ]
+
+
+def _build_index_banners():
+    banners = models.Banner.objects.select_related('news').only('image_url', 'news_id', 'news__title').\
+        filter(is_delete=False).order_by('priority')[0:SHOW_BANNER_COUNT]
+    banners = list(banners)
+    variants = get_image_variants(i.image_url for i in banners)
+    return [
+        dict({
+            'news_id': i.news_id,
+            'news_title': i.news.title,
+        }, **image_variant_urls(variants, i.image_url, 'banner'))
+        for i in banners
+    ]
+
+
+def get_index_tags():
+    return get_or_set_versioned('index_tags', INDEX_CACHE_VERSION_KEY, _build_index_tags, INDEX_CACHE_EXPIRES)
+
+
+def get_index_hot_news():
+    return get_or_set_versioned('index_hot_news', INDEX_CACHE_VERSION_KEY, _build_index_hot_news,
+                                INDEX_CACHE_EXPIRES)
+
+
+def get_index_banners():
+    return get_or_set_versioned('index_banners', INDEX_CACHE_VERSION_KEY, _build_index_banners, INDEX_CACHE_EXPIRES)
+
+
+def get_news_list_version_key(tag_id):
+    # 每个标签单独一个版本号，标签id为0表示全部标签的列表
+    return 'news_list_version_{}'.format(tag_id)
+
+
+def invalidate_news_list(tag_ids=None):
+    """
+    新闻列表接口缓存失效，全部标签的列表（标签id为0）总是失效
+    :param tag_ids: 发生变化的标签id，为None时所有标签的缓存都失效
+    """
+    if tag_ids is None:
+        tag_ids = list(models.Tag.objects.values_list('id', flat=True))
+    for tag_id in set(tag_ids) | {0}:
+        bump_cache_version(get_news_list_version_key(tag_id))
+
+
+def get_news_article_version_key(news_id):
+    # 每篇文章单独一个版本号，文章修改或删除时只有这一篇的缓存失效
+    return 'news_article_version_{}'.format(news_id)
+
+
+def invalidate_news_articles(news_ids):
+    """
+    文章详情页缓存失效，详情页中的标签名或作者用户名变化时使用
+    """
+    for news_id in news_ids:
+        bump_cache_version(get_news_article_version_key(news_id))
+
+
+def render_news_article(news_id):
+    """
+    渲染详情页的文章部分
+    :return: {'html': 渲染结果, 'render_ms': 查询和渲染耗时}，文章不存在时为空字典
+    """
+    start = time.time()
+    news = models.News.objects.select_related('tag', 'author').only(
+        'title', 'content', 'update_time', 'tag__name', 'author__username'
+    ).filter(is_delete=False, id=news_id).first()
+    if not news:
+        # 不存在的文章也缓存起来，创建文章时版本号会变化
+        return {}
+    html = render_to_string('news/news_article.html', {'news': news})
+    return {
+        'html': html,
+        'render_ms': round((time.time() - start) * 1000, 2),
+    }
+
+
+def get_news_article(news_id):
+    """
+    :return: 文章部分（同render_news_article）、是否命中缓存
+    """
+    missed = []
+
+    def builder():
+        missed.append(True)
+        return render_news_article(news_id)
+
+    article = get_or_set_versioned('news_article_{}'.format(news_id), get_news_article_version_key(news_id), builder,
+                                   NEWS_ARTICLE_CACHE_EXPIRES, stat_name='news_article')
+    return article, not missed
@@ -0,0 +1,90 @@
+'''
+新闻点击量缓冲：详情页每次访问只在redis中累加，
+由celery定时任务 flush_news_clicks 批量写入 tb_news
+'''
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django_redis import get_redis_connection
+
+from news import models
+from utils.redis_lock import redis_lock
+from .hot_list import incr_hot_news_clicks
+from .constants import NEWS_CLICKS_KEY, NEWS_CLICKS_PENDING_KEY, NEWS_CLICKS_FLUSH_LOCK_KEY, \
+    NEWS_CLICKS_FLUSH_LOCK_EXPIRES, NEWS_CLICKS_FLUSH_BATCH_SIZE
+
+logger = logging.getLogger('django')
+
+# 取出全部点击增量并清空，和计数一起在一条命令中完成，期间的点击不会丢失
+# 返回 [新闻id, 增量, 新闻id, 增量, ...]
+TAKE_CLICKS_SCRIPT = """
+local clicks = redis.call('hgetall', KEYS[1])
+redis.call('del', KEYS[1], KEYS[2])
+return clicks
+"""
+
+
+def incr_news_clicks(news_id):
+    """
+    点击量加一
+    :return: 是否需要立即写库
+    """
+    con_redis = get_redis_connection('default')
+    pl = con_redis.pipeline()
+    pl.hincrby(NEWS_CLICKS_KEY, news_id, 1)
+    pl.incr(NEWS_CLICKS_PENDING_KEY)
+    _, pending = pl.execute()
+    # 只在刚好达到上限时触发一次，写库后计数会清零
+    return pending == settings.NEWS_CLICKS_MAX_PENDING
+
+
+def _update_clicks(deltas):
+    # 一条UPDATE语句更新一批新闻：clicks = clicks + CASE id WHEN ... END
+    models.News.objects.filter(id__in=deltas.keys()).update(
+        clicks=F('clicks') + Case(
+            *[When(id=news_id, then=Value(delta)) for news_id, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+    )
+
+
+def flush_news_clicks():
+    """
+    把redis中的点击增量批量写入数据库
+    :return: 写入的新闻数
+    """
+    con_redis = get_redis_connection('default')
+    # 同一时间只允许一个写库任务
+    with redis_lock(con_redis, NEWS_CLICKS_FLUSH_LOCK_KEY, NEWS_CLICKS_FLUSH_LOCK_EXPIRES) as locked:
+        if not locked:
+            logger.info('点击量写库任务正在执行')
+            return 0
+        # 取出后redis中不再保留这批增量，写库成功后进程退出也不会重复累加
+        clicks = con_redis.eval(TAKE_CLICKS_SCRIPT, 2, NEWS_CLICKS_KEY, NEWS_CLICKS_PENDING_KEY)
+        if not clicks:
+            # 没有新的点击
+            return 0
+        deltas = {int(news_id): int(delta) for news_id, delta in zip(clicks[::2], clicks[1::2])}
+        news_ids = list(deltas.keys())
+        try:
+            with transaction.atomic():
+                for i in range(0, len(news_ids), NEWS_CLICKS_FLUSH_BATCH_SIZE):
+                    _update_clicks({news_id: deltas[news_id] for news_id in news_ids[i:i + NEWS_CLICKS_FLUSH_BATCH_SIZE]})
+        except Exception:
+            # 写库失败，增量和待写库的点击数加回redis，下次重试，达到上限时仍然会触发写库
+            pl = con_redis.pipeline()
+            for news_id, delta in deltas.items():
+                pl.hincrby(NEWS_CLICKS_KEY, news_id, delta)
+            pl.incrby(NEWS_CLICKS_PENDING_KEY, sum(deltas.values()))
+            pl.execute()
+            raise
+        try:
+            # 热门新闻排行按点击量排序
+            incr_hot_news_clicks(deltas)
+        except Exception as e:
+            logger.error('热门新闻排行点击量更新异常：\n{}'.format(e))
+        logger.info('点击量写库完成，新闻数：{}'.format(len(deltas)))
+        return len(deltas)
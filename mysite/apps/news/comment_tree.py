@@ -0,0 +1,103 @@
+'''
+评论树：查询出评论后在内存中按id组装父子关系
+'''
+import pytz
+from django.db.models import Exists, OuterRef, Q
+
+from news import models
+from .constants import COMMENT_THREADS_PER_PAGE, DELETED_COMMENT_TEXT
+
+shanghai_tz = pytz.timezone('Asia/Shanghai')
+
+# 评论序列化需要查询的字段
+COMMENT_FIELDS = ('id', 'news_id', 'parent_id', 'content', 'update_time', 'author__username', 'is_delete')
+
+
+def _comment_node(row):
+    # 和Comments.to_dict_data格式相同，增加回复列表children，deleted为True时是已删除评论的占位
+    if row['is_delete']:
+        return {
+            'news_id': row['news_id'],
+            'comment_id': row['id'],
+            'content': DELETED_COMMENT_TEXT,
+            'author': '',
+            'update_time': '',
+            'parent': None,
+            'children': [],
+            'deleted': True,
+        }
+    return {
+        'news_id': row['news_id'],
+        'comment_id': row['id'],
+        'content': row['content'],
+        'author': row['author__username'],
+        'update_time': shanghai_tz.normalize(row['update_time']).strftime('%Y年%m月%d日 %H:%M'),
+        'parent': None,
+        'children': [],
+        'deleted': False,
+    }
+
+
+def _prune_deleted(nodes):
+    # 去掉没有未删除回复的已删除评论
+    kept = []
+    for node in nodes:
+        node['children'] = _prune_deleted(node['children'])
+        if not node['deleted'] or node['children']:
+            kept.append(node)
+    return kept
+
+
+def build_comment_tree(rows):
+    """
+    :param rows: 评论字典列表，顶层评论按id倒序排在回复之前
+    :return: 顶层评论列表，每条评论的children为对它的回复
+    """
+    nodes = {}
+    for row in rows:
+        nodes[row['id']] = (row['parent_id'], _comment_node(row))
+
+    roots = []
+    for parent_id, node in nodes.values():
+        parent = nodes.get(parent_id)
+        if parent:
+            parent_node = parent[1]
+            # 回复中只带上父评论的作者和内容，不再递归
+            node['parent'] = {
+                'comment_id': parent_node['comment_id'],
+                'author': parent_node['author'],
+                'content': parent_node['content'],
+            }
+            parent_node['children'].append(node)
+        else:
+            # 顶层评论
+            roots.append(node)
+    return _prune_deleted(roots)
+
+
+def load_comment_threads(news_id, cursor=None, limit=COMMENT_THREADS_PER_PAGE):
+    """
+    游标分页加载顶层评论及其全部回复，只查询当前页涉及的评论，耗时和评论总数无关
+    顶层评论按id倒序（最新的在前），当前页的全部回复按root_id一次查询，和回复嵌套层数无关
+    已删除评论下未删除的回复仍然显示（和新闻的评论数一致），已删除的评论显示为占位
+    :param cursor: 上一页返回的游标（最后一条顶层评论的id），为空时取第一页
+    :return: 顶层评论树列表、下一页游标（没有更多数据时为None）
+    """
+    comments = models.Comments.objects.all()
+    # 已删除的顶层评论只在整个评论串中还有未删除的回复时查询出来，每页的顶层评论数不会因为去掉占位而变少
+    has_live_replies = Exists(models.Comments.objects.filter(root_id=OuterRef('id'), is_delete=False))
+    roots = comments.annotate(has_live_replies=has_live_replies).\
+        filter(Q(is_delete=False) | Q(has_live_replies=True), news_id=news_id, parent__isnull=True)
+    if cursor:
+        roots = roots.filter(id__lt=cursor)
+    # 多取一条判断是否还有下一页
+    rows = list(roots.values(*COMMENT_FIELDS).order_by('-id')[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1]['id']
+
+    if rows:
+        # 已删除的回复也要查询，作为下面未删除回复的占位
+        rows.extend(comments.filter(root_id__in=[row['id'] for row in rows]).values(*COMMENT_FIELDS).order_by('-id'))
+    return build_comment_tree(rows), next_cursor
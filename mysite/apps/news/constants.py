@@ -5,4 +5,80 @@ PER_PAGE_NEWS_COUNT = 5
 SHOW_HOTNEWS_COUNT = 3
 
 # 显示轮播图数量
-SHOW_BANNER_COUNT = 6
\ No newline at end of file
+SHOW_BANNER_COUNT = 6
+
+# 首页缓存（标签、热门新闻）版本号键，相关数据修改时版本号加一
+INDEX_CACHE_VERSION_KEY = 'index_cache_version'
+
+# 首页缓存有效期，单位秒（版本号变化时立即失效，有效期只是兜底）
+INDEX_CACHE_EXPIRES = 60 * 60
+
+
+# 游标分页模式下总页数估算值的缓存有效期，单位秒
+NEWS_TOTAL_PAGES_CACHE_EXPIRES = 10 * 60
+
+# 新闻列表接口响应缓存有效期，单位秒
+NEWS_LIST_CACHE_EXPIRES = 10 * 60
+
+# 新闻点击量缓冲hash，字段为新闻id，值为未写库的点击增量
+NEWS_CLICKS_KEY = 'news_clicks'
+
+# 未写库的点击总数
+NEWS_CLICKS_PENDING_KEY = 'news_clicks_pending'
+
+# 点击量写库锁，有效期单位秒
+NEWS_CLICKS_FLUSH_LOCK_KEY = 'news_clicks_flush_lock'
+NEWS_CLICKS_FLUSH_LOCK_EXPIRES = 5 * 60
+
+# 点击量写库时每条UPDATE语句包含的新闻数
+NEWS_CLICKS_FLUSH_BATCH_SIZE = 500
+
+# 新闻详情页每页显示的顶层评论数
+COMMENT_THREADS_PER_PAGE = 20
+
+# 新闻详情页文章部分缓存有效期，单位秒
+NEWS_ARTICLE_CACHE_EXPIRES = 60 * 60
+
+# 等待更新搜索索引的新闻id集合，同一篇新闻多次修改只保留一个id
+NEWS_INDEX_QUEUE_KEY = 'news_index_queue'
+
+# 已经提交了索引任务的标记，有效期内的修改合并到同一个任务中，单位秒
+NEWS_INDEX_TRIGGER_KEY = 'news_index_trigger'
+NEWS_INDEX_TRIGGER_DELAY = 5
+
+# 索引任务锁，有效期单位秒
+NEWS_INDEX_LOCK_KEY = 'news_index_lock'
+NEWS_INDEX_LOCK_EXPIRES = 5 * 60
+
+# 每次批量提交给elasticsearch的新闻数
+NEWS_INDEX_BATCH_SIZE = 200
+
+# 搜索结果缓存，索引更新时版本号加一，有效期单位秒
+NEWS_SEARCH_VERSION_KEY = 'news_search_version'
+NEWS_SEARCH_CACHE_EXPIRES = 60
+
+# 搜索联想返回的标题数、缓存有效期（单位秒）、浏览器缓存时间（单位秒）
+NEWS_SUGGEST_COUNT = 8
+NEWS_SUGGEST_CACHE_EXPIRES = 5 * 60
+NEWS_SUGGEST_MAX_AGE = 60
+
+# 热门新闻排行（有序集合，分数由优先级和点击量计算）和新闻信息hash
+NEWS_HOT_RANK_KEY = 'news_hot_rank'
+NEWS_HOT_ITEMS_KEY = 'news_hot_items'
+# 排行已经生成的标记，热门新闻为空时也不会重复查询数据库
+NEWS_HOT_BUILT_KEY = 'news_hot_built'
+
+# 新闻图片缩略图：名称、(宽, 高)，按2倍像素生成
+# thumb：新闻列表和首页热门新闻（显示225x160、250x179），banner：首页轮播图（显示800x200）
+NEWS_IMAGE_VARIANTS = {
+    'thumb': (450, 320),
+    'banner': (1600, 400),
+}
+NEWS_IMAGE_JPEG_QUALITY = 80
+NEWS_IMAGE_WEBP_QUALITY = 75
+# 原图地址和缩略图地址的对应关系（hash），字段：原图地址，值：{缩略图名称: 地址}
+# 数据保存在ImageVariants表中，这里是缓存
+NEWS_IMAGE_VARIANTS_KEY = 'news_image_variants'
+
+# 已删除评论下仍有回复时，显示在原评论位置的文字
+DELETED_COMMENT_TEXT = '原评论已删除'
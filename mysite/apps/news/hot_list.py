@@ -0,0 +1,90 @@
+'''
+热门新闻排行：按 优先级、点击量 排序的结果保存在redis有序集合中，
+热门新闻修改时整体重建，点击量写库后只更新分数
+'''
+import json
+
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from news import models
+from .constants import NEWS_HOT_RANK_KEY, NEWS_HOT_ITEMS_KEY, NEWS_HOT_BUILT_KEY
+
+# 优先级相同时按点击量排序，点击量远小于该值
+PRIORITY_WEIGHT = 10 ** 12
+
+
+def hot_news_score(priority, clicks):
+    # 分数从大到小排列：优先级数字越小越靠前，其次点击量越大越靠前
+    return (10 - priority) * PRIORITY_WEIGHT + clicks
+
+
+def rebuild_hot_list():
+    """
+    从数据库重新生成热门新闻排行
+    :return: 热门新闻数
+    """
+    hot_news = models.HotNews.objects.select_related('news__tag', 'news__author').only(
+        'priority', 'update_time', 'news__title', 'news__digest', 'news__image_url', 'news__clicks',
+        'news__tag__name', 'news__author__username'
+    ).filter(is_delete=False)
+    scores = {}
+    items = {}
+    for i in hot_news:
+        scores[i.news_id] = hot_news_score(i.priority, i.news.clicks)
+        items[i.news_id] = json.dumps({
+            'id': i.news_id,
+            'title': i.news.title,
+            'digest': i.news.digest,
+            'image_url': i.news.image_url,
+            'tag_name': i.news.tag.name if i.news.tag else '',
+            'author': i.news.author.username if i.news.author else '',
+            'update_time': timezone.localtime(i.update_time).strftime('%Y年%m月%d日 %H:%M'),
+        })
+
+    con_redis = get_redis_connection('default')
+    # 在一个事务中替换，读取时不会看到只生成了一半的排行
+    pl = con_redis.pipeline()
+    pl.delete(NEWS_HOT_RANK_KEY, NEWS_HOT_ITEMS_KEY)
+    if scores:
+        pl.zadd(NEWS_HOT_RANK_KEY, scores)
+        pl.hset(NEWS_HOT_ITEMS_KEY, mapping=items)
+    pl.set(NEWS_HOT_BUILT_KEY, 1)
+    pl.execute()
+    return len(scores)
+
+
+def incr_hot_news_clicks(deltas):
+    """
+    点击量写库后更新排行中的分数，不在排行中的新闻忽略
+    :param deltas: {新闻id: 点击增量}
+    """
+    con_redis = get_redis_connection('default')
+    news_ids = list(deltas.keys())
+    pl = con_redis.pipeline(transaction=False)
+    for news_id in news_ids:
+        pl.zscore(NEWS_HOT_RANK_KEY, news_id)
+    scores = pl.execute()
+    for news_id, score in zip(news_ids, scores):
+        if score is not None:
+            pl.zincrby(NEWS_HOT_RANK_KEY, deltas[news_id], news_id)
+    pl.execute()
+
+
+def get_hot_news_page(start, count):
+    """
+    :param start: 起始位置
+    :param count: 条数
+    :return: 热门新闻总数、当前页热门新闻列表
+    """
+    con_redis = get_redis_connection('default')
+    if not con_redis.exists(NEWS_HOT_BUILT_KEY):
+        rebuild_hot_list()
+    pl = con_redis.pipeline(transaction=False)
+    pl.zcard(NEWS_HOT_RANK_KEY)
+    pl.zrevrange(NEWS_HOT_RANK_KEY, start, start + count - 1)
+    total, news_ids = pl.execute()
+    if not news_ids:
+        return total, []
+    items = con_redis.hmget(NEWS_HOT_ITEMS_KEY, news_ids)
+    return total, [json.loads(item) for item in items if item]
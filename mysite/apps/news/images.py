@@ -0,0 +1,175 @@
+'''
+新闻图片缩略图：上传到fastdfs的图片由celery任务 make_news_image_variants 生成列表缩略图、轮播图尺寸的jpeg和webp，
+原图地址和缩略图地址的对应关系保存在ImageVariants表中，redis hash作为缓存，新闻列表、首页轮播图和热门新闻返回缩略图地址，
+没有缩略图的图片（七牛云、外部地址、任务还未完成）返回原图地址
+'''
+import io
+import json
+import logging
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django_redis import get_redis_connection
+
+from news import models
+from utils.cache_fun import bump_cache_version
+from utils.fastdfs.fdfs import get_fdfs_client, upload_file
+from .constants import NEWS_IMAGE_VARIANTS, NEWS_IMAGE_JPEG_QUALITY, NEWS_IMAGE_WEBP_QUALITY, NEWS_IMAGE_VARIANTS_KEY, \
+    INDEX_CACHE_VERSION_KEY
+
+logger = logging.getLogger('django')
+
+
+def get_fdfs_file_id(image_url):
+    """
+    :return: fastdfs上的图片返回Remote file_id，其他地址返回None
+    """
+    prefix = settings.FASTDFS_SERVER_DOMAIN.rstrip('/') + '/'
+    if image_url and image_url.startswith(prefix):
+        return image_url[len(prefix):]
+    return None
+
+
+def _fit(image, size):
+    # 按目标宽高比居中裁剪后缩小，原图不够大时不放大
+    width, height = size
+    scale = min(image.width / width, image.height / height, 1)
+    size = (max(int(width * scale), 1), max(int(height * scale), 1))
+    return ImageOps.fit(image, size, Image.LANCZOS)
+
+
+def _encode(image, image_format):
+    # image的模式为RGB或RGBA
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        if image.mode == 'RGBA':
+            # jpeg不支持透明，透明背景改为白色
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        image.save(buffer, 'JPEG', quality=NEWS_IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=NEWS_IMAGE_WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def _upload(data, ext_name):
+    upload_res = upload_file(ContentFile(data), file_ext_name=ext_name)
+    if upload_res.get('Status') != 'Upload successed.':
+        raise IOError('缩略图上传到FastDFS服务器失败')
+    return settings.FASTDFS_SERVER_DOMAIN + '/' + upload_res['Remote file_id']
+
+
+def build_image_variants(image_url):
+    """
+    生成并上传图片的缩略图
+    :return: {缩略图名称: 地址}，名称为thumb、thumb_webp、banner、banner_webp，比原图大的缩略图不生成
+    """
+    file_id = get_fdfs_file_id(image_url)
+    content = get_fdfs_client().download_to_buffer(file_id.encode())['Content']
+    image = Image.open(io.BytesIO(content))
+    if getattr(image, 'is_animated', False):
+        # 动图只保留第一帧会丢失动画，使用原图
+        return {}
+    image = ImageOps.exif_transpose(image)
+    # 调色板等模式缩放时只能使用最近邻插值，先转换为RGB/RGBA
+    if image.mode in ('P', 'LA', 'PA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+
+    variants = {}
+    for name, size in NEWS_IMAGE_VARIANTS.items():
+        resized = _fit(image, size)
+        for variant_name, image_format, ext_name in ((name, 'JPEG', 'jpg'), (name + '_webp', 'WEBP', 'webp')):
+            data = _encode(resized, image_format)
+            if len(data) < len(content):
+                variants[variant_name] = _upload(data, ext_name)
+    return variants
+
+
+def make_image_variants(image_url, force=False):
+    """
+    生成缩略图并登记，使用该图片的新闻列表、首页缓存失效
+    :return: {缩略图名称: 地址}，不是fastdfs上的图片时为None
+    """
+    if not get_fdfs_file_id(image_url):
+        return None
+    if not force:
+        variants = get_image_variants([image_url])
+        if image_url in variants:
+            return variants[image_url]
+
+    variants = build_image_variants(image_url)
+    # 没有缩略图时也登记，不再重复处理
+    models.ImageVariants.objects.update_or_create(image_url=image_url, defaults={'variants': json.dumps(variants)})
+    _cache_image_variants({image_url: json.dumps(variants)})
+
+    # caches中导入了本模块，在函数中导入
+    from .caches import invalidate_news_list
+    tag_ids = set(models.News.objects.filter(image_url=image_url).values_list('tag_id', flat=True))
+    if tag_ids:
+        invalidate_news_list(tag_id for tag_id in tag_ids if tag_id)
+    if tag_ids or models.Banner.objects.filter(image_url=image_url).exists():
+        bump_cache_version(INDEX_CACHE_VERSION_KEY)
+    return variants
+
+
+def schedule_image_variants(image_url):
+    """
+    提交生成缩略图的任务，不是fastdfs上的图片忽略
+    """
+    if not get_fdfs_file_id(image_url):
+        return
+    # 在函数中导入，避免django初始化时导入celery
+    from celery_tasks.news import tasks as news_tasks
+    try:
+        news_tasks.make_news_image_variants.delay(image_url)
+    except Exception as e:
+        # 没有缩略图时使用原图，可以用 manage.py make_image_variants 补充生成
+        logger.error('提交缩略图任务异常：\n{}'.format(e))
+
+
+def _cache_image_variants(values):
+    # values：{原图地址: json}
+    try:
+        get_redis_connection('default').hmset(NEWS_IMAGE_VARIANTS_KEY, values)
+    except Exception as e:
+        logger.error('缩略图地址缓存写入异常：\n{}'.format(e))
+
+
+def get_image_variants(image_urls):
+    """
+    一次查询多个图片的缩略图，先读redis缓存，缓存中没有的再查询数据库并写入缓存
+    :return: {原图地址: {缩略图名称: 地址}}，没有登记的图片不在结果中
+    """
+    image_urls = list({url for url in image_urls if get_fdfs_file_id(url)})
+    if not image_urls:
+        return {}
+    try:
+        values = get_redis_connection('default').hmget(NEWS_IMAGE_VARIANTS_KEY, image_urls)
+    except Exception as e:
+        logger.error('缩略图地址读取异常：\n{}'.format(e))
+        values = [None] * len(image_urls)
+    cached = {url: value for url, value in zip(image_urls, values) if value}
+    missed = [url for url in image_urls if url not in cached]
+    if missed:
+        stored = dict(models.ImageVariants.objects.filter(image_url__in=missed).values_list('image_url', 'variants'))
+        if stored:
+            _cache_image_variants(stored)
+        cached.update(stored)
+    return {url: json.loads(value) for url, value in cached.items()}
+
+
+def image_variant_urls(variants, image_url, name):
+    """
+    :param variants: get_image_variants的结果
+    :param name: 缩略图名称 thumb、banner
+    :return: {'image_url': jpeg缩略图地址，没有时为原图地址, 'image_webp_url': webp缩略图地址，没有时为空字符串}
+    """
+    image_variants = variants.get(image_url, {})
+    return {
+        'image_url': image_variants.get(name, image_url),
+        'image_webp_url': image_variants.get(name + '_webp', ''),
+    }
@@ -0,0 +1,36 @@
+'''
+为已有新闻和轮播图的图片生成缩略图，用于缩略图功能上线时回填数据，只处理fastdfs上的图片
+python manage.py make_image_variants [--force] [--news-id 1 2 3]
+'''
+from django.core.management.base import BaseCommand
+
+from news import models
+from news.images import make_image_variants, get_fdfs_file_id
+
+
+class Command(BaseCommand):
+    help = '为新闻和轮播图的图片生成缩略图'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='已经生成过的图片重新生成')
+        parser.add_argument('--news-id', type=int, nargs='*', help='只处理指定新闻的图片，不处理轮播图')
+
+    def handle(self, *args, **options):
+        news = models.News.objects.filter(is_delete=False)
+        if options['news_id']:
+            news = news.filter(id__in=options['news_id'])
+        image_urls = set(news.values_list('image_url', flat=True))
+        if not options['news_id']:
+            image_urls.update(models.Banner.objects.filter(is_delete=False).values_list('image_url', flat=True))
+        image_urls = sorted(url for url in image_urls if get_fdfs_file_id(url))
+
+        failed = 0
+        for i, image_url in enumerate(image_urls, 1):
+            try:
+                variants = make_image_variants(image_url, force=options['force'])
+            except Exception as e:
+                failed += 1
+                self.stderr.write('{} 生成失败：{}'.format(image_url, e))
+                continue
+            self.stdout.write('{}/{} {} {}'.format(i, len(image_urls), image_url, ' '.join(sorted(variants))))
+        self.stdout.write(self.style.SUCCESS('缩略图生成完成，图片数：{}，失败：{}'.format(len(image_urls) - failed, failed)))
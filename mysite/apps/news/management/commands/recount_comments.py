@@ -0,0 +1,39 @@
+'''
+重新统计新闻的评论数，用于comment_count字段上线时回填数据以及修正计数
+python manage.py recount_comments [--batch-size 1000] [--news-id 1 2 3]
+'''
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from news import models
+
+
+class Command(BaseCommand):
+    help = '重新统计新闻的评论数（comment_count）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每条UPDATE语句更新的新闻数')
+        parser.add_argument('--news-id', type=int, nargs='*', help='只统计指定的新闻')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # 每篇新闻未删除的评论数，作为UPDATE语句中的关联子查询
+        count_query = models.Comments.objects.filter(news_id=OuterRef('pk'), is_delete=False).\
+            order_by().values('news_id').annotate(num=Count('id')).values('num')
+        comment_count = Coalesce(Subquery(count_query, output_field=IntegerField()), 0)
+
+        news = models.News.objects.order_by('id')
+        if options['news_id']:
+            news = news.filter(id__in=options['news_id'])
+        news_ids = list(news.values_list('id', flat=True))
+
+        updated = 0
+        # 按id分批更新，避免一条语句长时间锁住整张表
+        for i in range(0, len(news_ids), batch_size):
+            batch_ids = news_ids[i:i + batch_size]
+            with transaction.atomic():
+                updated += models.News.objects.filter(id__in=batch_ids).update(comment_count=comment_count)
+            self.stdout.write('已更新 {}/{}'.format(updated, len(news_ids)))
+        self.stdout.write(self.style.SUCCESS('评论数统计完成，新闻数：{}'.format(updated)))
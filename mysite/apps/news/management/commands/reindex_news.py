@@ -0,0 +1,227 @@
+'''
+并行重建新闻搜索索引，建好新索引后切换别名，重建过程中搜索不受影响
+python manage.py reindex_news [--workers 4] [--chunk-size 5000] [--batch-size 500] [--resume] [--delete-old]
+进度记录在检查点文件中，中断后使用 --resume 从未完成的id区间继续
+'''
+import json
+import os
+import time
+from datetime import datetime
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections as db_connections
+from django.db.models import Max, Min
+from django.utils import timezone
+from haystack import connections
+
+from news import models
+from news.constants import NEWS_SEARCH_VERSION_KEY
+from news.search_queue import enqueue_news_index, remove_news_from_index
+from utils.cache_fun import bump_cache_version
+
+
+def _get_backend(using, index_name):
+    backend = connections[using].get_backend()
+    if not hasattr(backend, 'conn'):
+        raise CommandError('搜索连接{}不是elasticsearch'.format(using))
+    # 写入新索引，mapping已经在创建索引时指定
+    backend.index_name = index_name
+    backend.setup_complete = True
+    backend.silently_fail = False
+    return backend
+
+
+def _index_fields(index):
+    # 索引字段和文档模板news_text.txt用到的模型字段，只查询这些字段
+    fields = {field.model_attr for field in index.fields.values() if field.model_attr}
+    return fields | {'title', 'digest', 'content'}
+
+
+def _index_range(args):
+    """
+    子进程中索引一个id区间[start, end)
+    :return: 区间起始id、索引的新闻数
+    """
+    using, index_name, start, end, batch_size = args
+    # fork时继承的elasticsearch连接不能和父进程共用
+    connections.reload(using)
+    backend = _get_backend(using, index_name)
+    index = connections[using].get_unified_index().get_index(models.News)
+    news = index.index_queryset(using=using).filter(id__gte=start, id__lt=end).\
+        only(*_index_fields(index)).order_by('id')
+
+    count = 0
+    batch = []
+    for obj in news.iterator(chunk_size=batch_size):
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            backend.update(index, batch, commit=False)
+            count += len(batch)
+            batch = []
+    if batch:
+        backend.update(index, batch, commit=False)
+        count += len(batch)
+    return start, count
+
+
+class Command(BaseCommand):
+    help = '并行重建新闻搜索索引，完成后切换索引别名'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--using', default='default', help='HAYSTACK_CONNECTIONS中的连接名')
+        parser.add_argument('--workers', type=int, default=4, help='进程数')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='每个任务负责的id区间大小')
+        parser.add_argument('--batch-size', type=int, default=500, help='每次批量提交的新闻数')
+        parser.add_argument('--checkpoint', default='reindex_news.json', help='检查点文件路径')
+        parser.add_argument('--resume', action='store_true', help='从检查点继续上次未完成的重建')
+        parser.add_argument('--delete-old', action='store_true', help='切换别名后删除旧索引')
+
+    def load_checkpoint(self, options, alias, id_range):
+        """
+        :param id_range: 需要索引的新闻id范围 {'min_id': , 'max_id': }，继续时使用检查点中记录的范围
+        """
+        if options['resume']:
+            if not os.path.exists(options['checkpoint']):
+                raise CommandError('检查点文件{}不存在'.format(options['checkpoint']))
+            with open(options['checkpoint']) as f:
+                checkpoint = json.load(f)
+            # 已完成区间的起始id按区间大小和最小id划分，参数不同时区间对不上，会漏掉或重复索引
+            if 'min_id' not in checkpoint:
+                raise CommandError('检查点中没有记录id范围，不能继续，请重新开始重建')
+            if checkpoint['chunk_size'] != options['chunk_size']:
+                raise CommandError('检查点的区间大小为{}，和 --chunk-size {}不一致，不能继续'.format(
+                    checkpoint['chunk_size'], options['chunk_size']))
+            return checkpoint
+        return {
+            'index': '{}_{}'.format(alias, datetime.now().strftime('%Y%m%d%H%M%S')),
+            'started_at': timezone.now().isoformat(),
+            'chunk_size': options['chunk_size'],
+            # 开始后新增的新闻不在范围内，由最后按修改时间补充索引
+            'min_id': id_range['min_id'],
+            'max_id': id_range['max_id'],
+            'done': [],
+        }
+
+    def save_checkpoint(self, options, checkpoint):
+        # 先写临时文件再改名，中断时不会留下不完整的检查点
+        tmp_path = '{}.tmp'.format(options['checkpoint'])
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, options['checkpoint'])
+
+    def create_index(self, backend, index_name, using):
+        if backend.conn.indices.exists(index=index_name):
+            return
+        fields = connections[using].get_unified_index().all_searchfields()
+        if hasattr(backend, 'build_mapping'):
+            mapping = backend.build_mapping(fields)
+        else:
+            backend.content_field_name, field_mapping = backend.build_schema(fields)
+            mapping = {'modelresult': {'properties': field_mapping}}
+        body = dict(backend.DEFAULT_SETTINGS, mappings=mapping)
+        backend.conn.indices.create(index=index_name, body=body)
+
+    def swap_alias(self, backend, alias, index_name, delete_old):
+        conn = backend.conn
+        old_indexes = []
+        actions = []
+        if conn.indices.exists_alias(name=alias):
+            old_indexes = list(conn.indices.get_alias(name=alias).keys())
+            actions = [{'remove': {'index': old_index, 'alias': alias}} for old_index in old_indexes]
+        elif conn.indices.exists(index=alias):
+            # 原来直接使用的索引名，需要删除才能作为别名
+            if not delete_old:
+                raise CommandError('{}是一个索引而不是别名，使用 --delete-old 删除后切换'.format(alias))
+            version = conn.info()['version']['number']
+            if tuple(int(i) for i in version.split('.')[:2]) >= (6, 4):
+                # 删除索引和添加别名在同一个请求中完成，切换过程中搜索不会找不到索引
+                actions.append({'remove_index': {'index': alias}})
+            else:
+                # 6.4以前的elasticsearch不支持remove_index，只能先删除，期间的搜索请求会失败
+                conn.indices.delete(index=alias)
+        actions.append({'add': {'index': index_name, 'alias': alias}})
+        # 一次请求中完成别名的移除和添加，旧索引在切换后再删除
+        conn.indices.update_aliases(body={'actions': actions})
+        if delete_old:
+            for old_index in old_indexes:
+                if old_index != index_name:
+                    conn.indices.delete(index=old_index)
+        return old_indexes
+
+    def remove_stale_news(self, backend, index_name, index, using, batch_size):
+        """
+        删除新索引中有、数据库中已经删除或不再需要索引的新闻，切换别名前调用
+        分批扫描新索引，每批只和数据库比较这一批id，内存占用和新闻总数无关
+        :return: 删除的新闻数
+        """
+        from elasticsearch.helpers import scan
+        # 只取文档id（news.news.<id>），不返回_source
+        hits = scan(backend.conn, index=index_name, doc_type='modelresult', size=batch_size,
+                    query={'query': {'match_all': {}}, '_source': False})
+        removed = 0
+        batch = []
+        for hit in hits:
+            batch.append(int(hit['_id'].rsplit('.', 1)[-1]))
+            if len(batch) >= batch_size:
+                removed += self.remove_missing(backend, index, using, batch)
+                batch = []
+        if batch:
+            removed += self.remove_missing(backend, index, using, batch)
+        return removed
+
+    def remove_missing(self, backend, index, using, news_ids):
+        indexed_ids = set(index.index_queryset(using=using).filter(id__in=news_ids).values_list('id', flat=True))
+        removed_ids = [news_id for news_id in news_ids if news_id not in indexed_ids]
+        if removed_ids:
+            remove_news_from_index(backend, removed_ids)
+        return len(removed_ids)
+
+    def handle(self, *args, **options):
+        using = options['using']
+        backend = connections[using].get_backend()
+        alias = backend.index_name
+        index = connections[using].get_unified_index().get_index(models.News)
+        id_range = index.index_queryset(using=using).aggregate(min_id=Min('id'), max_id=Max('id'))
+        checkpoint = self.load_checkpoint(options, alias, id_range)
+        index_name = checkpoint['index']
+        backend = _get_backend(using, index_name)
+        self.create_index(backend, index_name, using)
+        self.save_checkpoint(options, checkpoint)
+
+        chunk_size = checkpoint['chunk_size']
+        tasks = []
+        if checkpoint['min_id'] is not None:
+            for start in range(checkpoint['min_id'], checkpoint['max_id'] + 1, chunk_size):
+                if start not in checkpoint['done']:
+                    tasks.append((using, index_name, start, start + chunk_size, options['batch_size']))
+        self.stdout.write('索引{}，待处理区间：{}，已完成区间：{}'.format(index_name, len(tasks), len(checkpoint['done'])))
+
+        begin = time.time()
+        total = 0
+        # 子进程不能共用父进程的数据库连接
+        db_connections.close_all()
+        with Pool(options['workers']) as pool:
+            for start, count in pool.imap_unordered(_index_range, tasks):
+                checkpoint['done'].append(start)
+                self.save_checkpoint(options, checkpoint)
+                total += count
+                self.stdout.write('id区间[{}, {})完成，新闻数：{}'.format(start, start + chunk_size, count))
+
+        backend.conn.indices.refresh(index=index_name)
+        # 重建期间从数据库中删除的新闻没有修改时间可查，切换前和数据库比较，从新索引中删除
+        # 切换后搜索不会查到已经删除的新闻
+        removed = self.remove_stale_news(backend, index_name, index, using, options['batch_size'])
+        if removed:
+            backend.conn.indices.refresh(index=index_name)
+        self.stdout.write('新索引中删除已不存在的新闻：{}'.format(removed))
+        old_indexes = self.swap_alias(backend, alias, index_name, options['delete_old'])
+        bump_cache_version(NEWS_SEARCH_VERSION_KEY)
+        # 重建期间修改的新闻写入的是旧索引，放入索引队列，由定时任务更新到新索引
+        changed_ids = list(models.News.objects.filter(update_time__gte=checkpoint['started_at']).
+                           values_list('id', flat=True))
+        enqueue_news_index(changed_ids)
+        os.remove(options['checkpoint'])
+        self.stdout.write(self.style.SUCCESS(
+            '重建完成，新闻数：{}，耗时：{:.1f}秒，别名{}已从{}切换到{}'.format(
+                total, time.time() - begin, alias, old_indexes or '无', index_name)))
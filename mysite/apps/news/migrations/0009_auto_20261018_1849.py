@@ -0,0 +1,21 @@
+# Generated by Django 2.1.7 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0008_auto_20190521_1146'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(fields=['is_delete', 'tag', 'update_time', 'id'], name='news_del_tag_time_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(fields=['is_delete', 'update_time', 'id'], name='news_del_time_id_idx'),
+        ),
+    ]
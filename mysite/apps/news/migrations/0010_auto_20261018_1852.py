@@ -0,0 +1,17 @@
+# Generated by Django 2.1.7 on 2026-10-18 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0009_auto_20261018_1849'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comments',
+            index=models.Index(fields=['news', 'parent', 'is_delete', 'id'], name='comments_news_parent_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-18 10:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0011_news_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='is_searchable',
+            field=models.BooleanField(default=True, help_text='可搜索', verbose_name='可搜索'),
+        ),
+    ]
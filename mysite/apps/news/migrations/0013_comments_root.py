@@ -0,0 +1,34 @@
+# Generated by Django 2.1.7 on 2026-10-18 11:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_comments_root(apps, schema_editor):
+    # 回复的id大于父评论，按id顺序处理时父评论的顶层评论已经确定
+    Comments = apps.get_model('news', 'Comments')
+    root_ids = {}
+    replies = {}
+    for comment_id, parent_id in Comments.objects.filter(parent__isnull=False).order_by('id').\
+            values_list('id', 'parent_id').iterator():
+        root_id = root_ids.get(parent_id, parent_id)
+        root_ids[comment_id] = root_id
+        replies.setdefault(root_id, []).append(comment_id)
+    for root_id, comment_ids in replies.items():
+        Comments.objects.filter(id__in=comment_ids).update(root_id=root_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0012_tag_is_searchable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comments',
+            name='root',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_replies', to='news.Comments'),
+        ),
+        migrations.RunPython(fill_comments_root, migrations.RunPython.noop),
+    ]
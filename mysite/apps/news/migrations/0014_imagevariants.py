@@ -0,0 +1,47 @@
+# Generated by Django 2.1.7 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+def copy_redis_variants(apps, schema_editor):
+    # 之前只保存在redis中的缩略图地址写入数据库，redis不可用时可以用 manage.py make_image_variants 重新生成
+    import logging
+    from django_redis import get_redis_connection
+    ImageVariants = apps.get_model('news', 'ImageVariants')
+    try:
+        con_redis = get_redis_connection('default')
+        items = [
+            ImageVariants(image_url=image_url.decode(), variants=variants.decode())
+            for image_url, variants in con_redis.hscan_iter('news_image_variants')
+        ]
+    except Exception as e:
+        logging.getLogger('django').error('读取redis中的缩略图地址异常：\n{}'.format(e))
+        return
+    ImageVariants.objects.bulk_create(items, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0013_comments_root'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariants',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('update_time', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('is_delete', models.BooleanField(default=False, verbose_name='逻辑删除')),
+                ('image_url', models.URLField(help_text='原图url', unique=True, verbose_name='原图url')),
+                ('variants', models.TextField(default='{}', help_text='缩略图', verbose_name='缩略图')),
+            ],
+            options={
+                'verbose_name': '图片缩略图',
+                'verbose_name_plural': '图片缩略图',
+                'db_table': 'tb_image_variants',
+            },
+        ),
+        migrations.RunPython(copy_redis_variants, migrations.RunPython.noop),
+    ]
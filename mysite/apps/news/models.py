@@ -8,6 +8,8 @@ from django.core.validators import MinLengthValidator
 # 标签表
 class Tag(ModelBase):
     name=models.CharField(max_length=64, verbose_name="标签名", help_text="标签名")
+    # 标签下的文章是否建立搜索索引
+    is_searchable=models.BooleanField(default=True, verbose_name="可搜索", help_text="可搜索")
 
     class Meta:
         ordering = ['-update_time', '-id'] # 排序从大到小
@@ -25,6 +27,8 @@ class News(ModelBase):
     digest = models.CharField (max_length=200,validators=[MinLengthValidator(1)], verbose_name="摘要", help_text="摘要")
     content = models.TextField (verbose_name="内容", help_text="内容")
     clicks = models.IntegerField (default=0, verbose_name="点击量", help_text="点击量")
+    # 未删除的评论数（包括回复），由评论的信号处理函数增量维护
+    comment_count = models.IntegerField (default=0, verbose_name="评论数", help_text="评论数")
     image_url = models.URLField (default="", verbose_name="图片url", help_text="图片url")
     # 标签，外键关联tag表，一对多建表在多的地方，on_delete=models.SET_NULL 设置为空
     tag = models.ForeignKey ('Tag', on_delete=models.SET_NULL, null=True)
@@ -34,6 +38,11 @@ class News(ModelBase):
     class Meta:
         ordering = ['-update_time', '-id']
         db_table = "tb_news"  # 指明数据库表名
+        # 新闻列表按标签查询和查询全部标签时使用的联合索引
+        indexes = [
+            models.Index(fields=['is_delete', 'tag', 'update_time', 'id'], name='news_del_tag_time_id_idx'),
+            models.Index(fields=['is_delete', 'update_time', 'id'], name='news_del_time_id_idx'),
+        ]
         verbose_name = "新闻"  # 在admin站点中显示的名称
         verbose_name_plural = verbose_name  # 显示的复数名称
 
@@ -49,6 +58,16 @@ class Comments(ModelBase):
     news = models.ForeignKey ('News', on_delete=models.CASCADE)
     # 关联自己，做子评论
     parent = models.ForeignKey('self',on_delete=models.CASCADE,null=True,blank=True)
+    # 回复所在的顶层评论，顶层评论为空，加载评论树时按顶层评论一次查询出全部回复
+    root = models.ForeignKey('self',on_delete=models.CASCADE,null=True,blank=True,related_name='thread_replies')
+
+    def save(self, *args, **kwargs):
+        if self.parent_id and not self.root_id:
+            # 父评论是顶层评论时，父评论就是顶层评论
+            parent_root_id = Comments.objects.filter(id=self.parent_id).values_list('root_id', flat=True).first()
+            self.root_id = parent_root_id or self.parent_id
+        super().save(*args, **kwargs)
+
     # 模型中序列化
     def to_dict_data(self):
         shanghai_tz = pytz.timezone('Asia/Shanghai')
@@ -60,13 +79,25 @@ class Comments(ModelBase):
             'author':self.author.username,
             # 'update_time':self.update_time.strftime('%Y年%m月%d日 %H:%M'),
             'update_time':update_time_locale.strftime('%Y年%m月%d日 %H:%M'),
-            'parent':self.parent.to_dict_data() if self.parent else None,
+            # 父评论只序列化一层，避免沿着评论链递归查询
+            'parent':self.parent.to_parent_dict_data() if self.parent_id else None,
         }
         return comment_dict
 
+    def to_parent_dict_data(self):
+        return {
+            'comment_id':self.id,
+            'author':self.author.username,
+            'content':self.content,
+        }
+
     class Meta:
         ordering = ['-update_time', '-id']
         db_table = "tb_comments"  # 指明数据库表名
+        # 按新闻游标分页查询顶层评论时使用的联合索引
+        indexes = [
+            models.Index(fields=['news', 'parent', 'is_delete', 'id'], name='comments_news_parent_id_idx'),
+        ]
         verbose_name = "评论"  # 在admin站点中显示的名称
         verbose_name_plural = verbose_name  # 显示的复数名称
 
@@ -120,4 +151,18 @@ class Banner(ModelBase):
         verbose_name_plural = verbose_name  # 显示的复数名称
 
     def __str__(self):
-        return '<轮播图{}>'.format(self.id)
\ No newline at end of file
+        return '<轮播图{}>'.format(self.id)
+
+# 图片缩略图，原图地址和缩略图地址的对应关系，redis中的news_image_variants只是缓存
+class ImageVariants(ModelBase):
+    image_url = models.URLField(unique=True, verbose_name="原图url", help_text="原图url")
+    # json：{缩略图名称: 地址}，没有生成缩略图时为{}
+    variants = models.TextField(default='{}', verbose_name="缩略图", help_text="缩略图")
+
+    class Meta:
+        db_table = "tb_image_variants"  # 指明数据库表名
+        verbose_name = "图片缩略图"  # 在admin站点中显示的名称
+        verbose_name_plural = verbose_name  # 显示的复数名称
+
+    def __str__(self):
+        return '<缩略图{}>'.format(self.image_url)
@@ -0,0 +1,96 @@
+'''
+elasticsearch搜索后端：文档字段text（标题、摘要、正文）和stored=False的字段只建立索引，
+不保存在_source中，搜索结果中只返回列表页需要的字段
+'''
+import copy
+
+import haystack
+from haystack.backends.elasticsearch_backend import ElasticsearchSearchBackend, ElasticsearchSearchEngine
+from elasticsearch import NotFoundError
+
+
+# 搜索联想的最长前缀，超过的部分不参与匹配
+SUGGEST_MAX_GRAM = 20
+
+
+class NewsElasticsearchSearchBackend(ElasticsearchSearchBackend):
+    # haystack默认的edgengram_analyzer使用standard分词器，中文被拆成单字，
+    # 单字又被min_gram=2过滤掉，中文标题无法联想。
+    # 联想字段整个标题作为一个词，生成从1个字开始的前缀，搜索时输入的前缀不再切分
+    DEFAULT_SETTINGS = copy.deepcopy(ElasticsearchSearchBackend.DEFAULT_SETTINGS)
+    DEFAULT_SETTINGS['settings']['analysis']['analyzer'].update({
+        'suggest_index_analyzer': {
+            'type': 'custom',
+            'tokenizer': 'keyword',
+            'filter': ['lowercase', 'suggest_edgengram'],
+        },
+        'suggest_search_analyzer': {
+            'type': 'custom',
+            'tokenizer': 'keyword',
+            'filter': ['lowercase', 'suggest_truncate'],
+        },
+    })
+    DEFAULT_SETTINGS['settings']['analysis']['filter'].update({
+        'suggest_edgengram': {
+            'type': 'edgeNGram',
+            'min_gram': 1,
+            'max_gram': SUGGEST_MAX_GRAM,
+        },
+        'suggest_truncate': {
+            'type': 'truncate',
+            'length': SUGGEST_MAX_GRAM,
+        },
+    })
+
+    def build_schema(self, fields):
+        content_field_name, mapping = super().build_schema(fields)
+        for field in fields.values():
+            if field.field_type == 'edge_ngram':
+                mapping[field.index_fieldname].update({
+                    'analyzer': 'suggest_index_analyzer',
+                    'search_analyzer': 'suggest_search_analyzer',
+                })
+        return content_field_name, mapping
+
+    def build_mapping(self, fields):
+        """
+        :return: 索引的mapping，重建索引时也使用这里的mapping
+        """
+        self.content_field_name, field_mapping = self.build_schema(fields)
+        excludes = [self.content_field_name]
+        excludes.extend(field.index_fieldname for field in fields.values() if not field.stored)
+        return {
+            'modelresult': {
+                # 正文只用来搜索，不再保存第二份
+                '_source': {'excludes': excludes},
+                'properties': field_mapping,
+            }
+        }
+
+    def setup(self):
+        # 和父类相同，只是mapping改为build_mapping的结果
+        try:
+            self.existing_mapping = self.conn.indices.get_mapping(index=self.index_name)
+        except NotFoundError:
+            pass
+        except Exception:
+            if not self.silently_fail:
+                raise
+
+        unified_index = haystack.connections[self.connection_alias].get_unified_index()
+        current_mapping = self.build_mapping(unified_index.all_searchfields())
+
+        if current_mapping != self.existing_mapping:
+            try:
+                self.conn.indices.create(index=self.index_name, body=self.DEFAULT_SETTINGS, ignore=400)
+                self.conn.indices.put_mapping(index=self.index_name, doc_type='modelresult', body=current_mapping)
+                self.existing_mapping = current_mapping
+            except Exception:
+                if not self.silently_fail:
+                    raise
+
+        self.setup_complete = True
+
+
+class NewsElasticsearchSearchEngine(ElasticsearchSearchEngine):
+    backend = NewsElasticsearchSearchBackend
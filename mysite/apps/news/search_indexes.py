@@ -12,14 +12,19 @@ class NewsIndex(indexes.SearchIndex, indexes.Indexable):
     """
     News索引数据模型类
     """
+    # 标题、摘要、正文，只用来搜索，search_backends中设置为不保存在_source中
     text = indexes.CharField(document=True, use_template=True)
 
-    # 获取属性，如果没有就是news.object.id
-    id = indexes.IntegerField(model_attr='id')
+    # 以下字段保存在索引中，搜索结果页直接使用，不再查询数据库
+    # 不再定义id字段，否则会覆盖文档id（news.news.<id>），结果中使用pk
     title = indexes.CharField(model_attr='title')
+    # 标题前缀，用于搜索联想，只建立索引不保存
+    title_auto = indexes.EdgeNgramField(model_attr='title', stored=False)
     digest = indexes.CharField(model_attr='digest')
-    content = indexes.CharField(model_attr='content')
-    image_url = indexes.CharField(model_attr='image_url')
+    image_url = indexes.CharField(model_attr='image_url', indexed=False)
+    tag_name = indexes.CharField(model_attr='tag__name', null=True)
+    author = indexes.CharField(model_attr='author__username', null=True)
+    update_time = indexes.DateTimeField(model_attr='update_time')
     # comments = indexes.IntegerField(model_attr='comments')
 
     def get_model(self):
@@ -32,5 +37,5 @@ class NewsIndex(indexes.SearchIndex, indexes.Indexable):
         """
 
         # return self.get_model().objects.filter(is_delete=False)
-        # 其中之一：__in   在tag_id标签中，6个中的一个：tag_id__in=[1, 2, 3, 4, 5, 6]
-        return self.get_model ().objects.filter (is_delete=False, tag_id__in=[1, 2, 3, 4, 5, 6])
\ No newline at end of file
+        # 只索引可搜索标签下的文章，标签的is_searchable修改后由信号处理函数更新索引
+        return self.get_model ().objects.select_related('tag', 'author').filter (is_delete=False, tag__is_searchable=True)
\ No newline at end of file
@@ -0,0 +1,136 @@
+'''
+新闻搜索索引队列：新闻保存或删除时只把id放入redis集合，
+由celery任务 update_news_index 批量更新elasticsearch
+'''
+import logging
+
+from django.db import transaction
+from django_redis import get_redis_connection
+from haystack import connection_router, connections
+
+from news import models
+from utils.cache_fun import bump_cache_version
+from utils.redis_lock import redis_lock
+from .constants import NEWS_INDEX_QUEUE_KEY, NEWS_INDEX_TRIGGER_KEY, NEWS_INDEX_TRIGGER_DELAY, NEWS_INDEX_LOCK_KEY, \
+    NEWS_INDEX_LOCK_EXPIRES, NEWS_INDEX_BATCH_SIZE, NEWS_SEARCH_VERSION_KEY
+
+logger = logging.getLogger('django')
+
+
+def enqueue_news_index(news_ids):
+    """
+    新闻id放入索引队列
+    :return: 是否需要提交索引任务，NEWS_INDEX_TRIGGER_DELAY秒内只返回一次True
+    """
+    if not news_ids:
+        return False
+    con_redis = get_redis_connection('default')
+    pl = con_redis.pipeline()
+    pl.sadd(NEWS_INDEX_QUEUE_KEY, *news_ids)
+    pl.set(NEWS_INDEX_TRIGGER_KEY, 1, nx=True, ex=NEWS_INDEX_TRIGGER_DELAY)
+    _, triggered = pl.execute()
+    return bool(triggered)
+
+
+def _delay_index_task():
+    # 在函数中导入，避免django初始化时导入celery
+    from celery_tasks.news import tasks as news_tasks
+    try:
+        news_tasks.update_news_index.apply_async(countdown=NEWS_INDEX_TRIGGER_DELAY)
+    except Exception as e:
+        # 事务提交后执行，异常不能抛给保存数据的请求，队列中的新闻由定时任务处理
+        logger.error('提交搜索索引任务异常：\n{}'.format(e))
+
+
+def schedule_news_index(news_ids):
+    """
+    新闻id放入索引队列，需要时在事务提交后提交索引任务，保证任务能查询到修改后的数据
+    """
+    if enqueue_news_index(news_ids):
+        transaction.on_commit(_delay_index_task)
+
+
+def _schedule_news_index_in_batches(news):
+    news_ids = list(news.values_list('id', flat=True))
+    for i in range(0, len(news_ids), NEWS_INDEX_BATCH_SIZE):
+        schedule_news_index(news_ids[i:i + NEWS_INDEX_BATCH_SIZE])
+    return len(news_ids)
+
+
+def enqueue_tag_news_index(tag_id):
+    """
+    标签下的全部新闻放入索引队列，标签可搜索状态或标签名变化时使用
+    :return: 放入队列的新闻数
+    """
+    return _schedule_news_index_in_batches(models.News.objects.filter(tag_id=tag_id))
+
+
+def enqueue_author_news_index(author_id):
+    """
+    作者的全部新闻放入索引队列，用户名变化时使用
+    :return: 放入队列的新闻数
+    """
+    return _schedule_news_index_in_batches(models.News.objects.filter(author_id=author_id))
+
+
+def remove_news_from_index(backend, news_ids):
+    """
+    从backend.index_name指向的索引中批量删除新闻
+    """
+    if hasattr(backend, 'conn'):
+        from elasticsearch.helpers import bulk
+        # elasticsearch一次bulk请求删除，索引中不存在的文档忽略
+        actions = [
+            {'_op_type': 'delete', '_index': backend.index_name, '_type': 'modelresult', '_id': 'news.news.{}'.format(news_id)}
+            for news_id in news_ids
+        ]
+        bulk(backend.conn, actions, raise_on_error=False)
+    else:
+        for news_id in news_ids:
+            backend.remove('news.news.{}'.format(news_id))
+
+
+def _index_batch(news_ids):
+    # 存在且需要索引的新闻批量更新，其余的从索引中删除
+    for using in connection_router.for_write():
+        backend = connections[using].get_backend()
+        index = connections[using].get_unified_index().get_index(models.News)
+        news = index.index_queryset(using=using).filter(id__in=news_ids)
+        indexed_ids = set(news.values_list('id', flat=True))
+        if indexed_ids:
+            backend.update(index, news)
+        removed_ids = set(news_ids) - indexed_ids
+        if removed_ids:
+            remove_news_from_index(backend, removed_ids)
+
+
+def process_news_index_queue():
+    """
+    批量处理索引队列，直到队列为空
+    :return: 处理的新闻数
+    """
+    con_redis = get_redis_connection('default')
+    # 同一时间只允许一个索引任务
+    with redis_lock(con_redis, NEWS_INDEX_LOCK_KEY, NEWS_INDEX_LOCK_EXPIRES) as locked:
+        if not locked:
+            logger.info('搜索索引任务正在执行')
+            return 0
+        # 开始处理后的修改需要重新提交任务
+        con_redis.delete(NEWS_INDEX_TRIGGER_KEY)
+        count = 0
+        while True:
+            news_ids = [int(news_id) for news_id in con_redis.spop(NEWS_INDEX_QUEUE_KEY, NEWS_INDEX_BATCH_SIZE)]
+            if not news_ids:
+                break
+            try:
+                _index_batch(news_ids)
+            except Exception:
+                # 放回队列，下次任务重试
+                con_redis.sadd(NEWS_INDEX_QUEUE_KEY, *news_ids)
+                raise
+            count += len(news_ids)
+        if count:
+            # 索引变化后搜索结果缓存失效
+            bump_cache_version(NEWS_SEARCH_VERSION_KEY)
+            logger.info('搜索索引更新完成，新闻数：{}'.format(count))
+        return count
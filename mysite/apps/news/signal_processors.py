@@ -0,0 +1,40 @@
+'''
+haystack信号处理：代替RealtimeSignalProcessor，保存新闻时不再同步请求elasticsearch
+'''
+import logging
+
+from django.db.models import signals
+from haystack.signals import BaseSignalProcessor
+
+from news import models
+from .search_queue import schedule_news_index
+
+logger = logging.getLogger('django')
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """
+    新闻保存或删除时把id放入redis队列，延迟提交一个celery任务批量更新索引
+    """
+    def setup(self):
+        # 只有新闻建立了索引，不再监听所有模型
+        signals.post_save.connect(self.handle_save, sender=models.News)
+        signals.post_delete.connect(self.handle_delete, sender=models.News)
+
+    def teardown(self):
+        signals.post_save.disconnect(self.handle_save, sender=models.News)
+        signals.post_delete.disconnect(self.handle_delete, sender=models.News)
+
+    def enqueue(self, instance):
+        try:
+            schedule_news_index([instance.id])
+        except Exception as e:
+            # 索引异常不能影响数据保存
+            logger.error('搜索索引队列写入异常：\n{}'.format(e))
+
+    def handle_save(self, sender, instance, **kwargs):
+        self.enqueue(instance)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        # 任务中查询不到的新闻会从索引中删除
+        self.enqueue(instance)
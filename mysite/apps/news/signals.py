@@ -0,0 +1,190 @@
+import logging
+
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from news import models
+from users.models import User
+
+from utils.cache_fun import bump_cache_version
+from .constants import INDEX_CACHE_VERSION_KEY
+from .caches import invalidate_news_list, invalidate_news_articles, get_news_article_version_key
+from .search_queue import enqueue_tag_news_index, enqueue_author_news_index
+from .hot_list import rebuild_hot_list
+
+logger = logging.getLogger('django')
+
+
+# 标签、热门新闻、轮播图、新闻修改或删除时，首页缓存失效
+@receiver([post_save, post_delete], sender=models.Tag)
+@receiver([post_save, post_delete], sender=models.Banner)
+@receiver([post_save, post_delete], sender=models.HotNews)
+@receiver([post_save, post_delete], sender=models.News)
+def bump_index_cache_version(sender, **kwargs):
+    try:
+        bump_cache_version(INDEX_CACHE_VERSION_KEY)
+    except Exception as e:
+        # 缓存异常不能影响数据保存
+        logger.error('首页缓存版本号更新异常：\n{}'.format(e))
+
+
+@receiver(post_init, sender=models.News)
+def remember_news_tag(sender, instance, **kwargs):
+    # 记录加载时的标签id，文章修改标签后原标签的列表缓存也要失效
+    # 延迟加载的字段不在__dict__中，这里不会触发查询
+    instance._loaded_tag_id = instance.__dict__.get('tag_id')
+
+
+@receiver([post_save, post_delete], sender=models.News)
+def invalidate_news_list_cache(sender, instance, created=False, **kwargs):
+    tag_ids = {instance.__dict__.get('tag_id'), instance._loaded_tag_id}
+    if None in tag_ids and not created:
+        # 使用only()加载的文章不知道原来的标签，所有标签的缓存都失效
+        tag_ids = None
+    else:
+        tag_ids.discard(None)
+    try:
+        invalidate_news_list(tag_ids)
+    except Exception as e:
+        logger.error('新闻列表缓存版本号更新异常：\n{}'.format(e))
+
+
+@receiver(post_save, sender=models.Tag)
+def invalidate_tag_news_list_cache(sender, instance, **kwargs):
+    # 列表中包含标签名
+    try:
+        invalidate_news_list([instance.id])
+    except Exception as e:
+        logger.error('新闻列表缓存版本号更新异常：\n{}'.format(e))
+
+
+@receiver([post_save, post_delete], sender=models.News)
+def bump_news_article_cache_version(sender, instance, **kwargs):
+    # 文章修改或逻辑删除时详情页缓存失效
+    try:
+        bump_cache_version(get_news_article_version_key(instance.id))
+    except Exception as e:
+        logger.error('文章缓存版本号更新异常：\n{}'.format(e))
+
+
+@receiver(post_init, sender=models.Comments)
+def remember_comment_deleted(sender, instance, **kwargs):
+    # 记录加载时的逻辑删除状态，保存时据此判断评论数是否需要变化
+    instance._loaded_is_delete = instance.__dict__.get('is_delete')
+
+
+def _change_comment_count(news_id, delta):
+    # 直接在数据库中加减，不会触发News的信号，也不会覆盖并发的修改
+    models.News.objects.filter(id=news_id).update(comment_count=F('comment_count') + delta)
+
+
+@receiver(post_save, sender=models.Comments)
+def update_comment_count(sender, instance, created, **kwargs):
+    if created:
+        delta = 0 if instance.is_delete else 1
+    elif instance._loaded_is_delete is None:
+        # 使用only()等方式加载时没有is_delete字段，无法判断是否变化
+        delta = 0
+    else:
+        delta = int(bool(instance._loaded_is_delete)) - int(bool(instance.is_delete))
+    if delta:
+        _change_comment_count(instance.news_id, delta)
+    instance._loaded_is_delete = instance.is_delete
+
+
+@receiver(post_delete, sender=models.Comments)
+def decrease_comment_count(sender, instance, **kwargs):
+    # 物理删除未逻辑删除的评论，新闻被级联删除时更新不到任何行
+    if not instance.is_delete:
+        _change_comment_count(instance.news_id, -1)
+
+
+def _invalidate_renamed_news(news):
+    # 标签或作者改名后，相关文章的详情页缓存失效，在热门新闻中的要重建排行
+    try:
+        invalidate_news_articles(news.values_list('id', flat=True).iterator())
+    except Exception as e:
+        logger.error('文章缓存版本号更新异常：\n{}'.format(e))
+    try:
+        if models.HotNews.objects.filter(news__in=news).exists():
+            rebuild_hot_list()
+    except Exception as e:
+        logger.error('热门新闻排行重建异常：\n{}'.format(e))
+
+
+@receiver(post_init, sender=models.Tag)
+def remember_tag_searchable(sender, instance, **kwargs):
+    instance._loaded_is_searchable = instance.__dict__.get('is_searchable')
+    instance._loaded_name = instance.__dict__.get('name')
+
+
+def _tag_field_changed(instance, field_name):
+    # 加载时没有该字段（only()等）无法判断，当作没有变化
+    loaded = getattr(instance, '_loaded_{}'.format(field_name))
+    return loaded is not None and loaded != getattr(instance, field_name)
+
+
+@receiver(post_save, sender=models.Tag)
+def update_tag_news_index(sender, instance, created, **kwargs):
+    # 标签可搜索状态变化时，标签下的文章整体放入索引队列，由索引任务批量添加或删除
+    # 索引中保存了标签名，标签改名时也要更新
+    name_changed = not created and _tag_field_changed(instance, 'name')
+    if name_changed or (not created and _tag_field_changed(instance, 'is_searchable')):
+        try:
+            count = enqueue_tag_news_index(instance.id)
+            logger.info('标签{}修改为{}（可搜索：{}），{}篇文章等待更新索引'.format(
+                instance.id, instance.name, instance.is_searchable, count))
+        except Exception as e:
+            logger.error('标签文章索引队列写入异常：\n{}'.format(e))
+    if name_changed:
+        # 详情页和热门新闻排行中也有标签名
+        _invalidate_renamed_news(models.News.objects.filter(tag_id=instance.id))
+    instance._loaded_is_searchable = instance.is_searchable
+    instance._loaded_name = instance.name
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._loaded_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def update_author_news(sender, instance, created, **kwargs):
+    # 搜索索引和新闻列表缓存中保存了作者用户名，用户改名时需要更新
+    if not created and instance._loaded_username is not None and instance._loaded_username != instance.username:
+        try:
+            count = enqueue_author_news_index(instance.id)
+            logger.info('用户{}改名为{}，{}篇文章等待更新索引'.format(instance.id, instance.username, count))
+        except Exception as e:
+            logger.error('作者文章索引队列写入异常：\n{}'.format(e))
+        try:
+            tag_ids = set(models.News.objects.filter(author_id=instance.id).values_list('tag_id', flat=True))
+            if tag_ids:
+                tag_ids.discard(None)
+                invalidate_news_list(tag_ids)
+                # 首页合并接口中包含第一页新闻列表
+                bump_cache_version(INDEX_CACHE_VERSION_KEY)
+        except Exception as e:
+            logger.error('新闻列表缓存版本号更新异常：\n{}'.format(e))
+        _invalidate_renamed_news(models.News.objects.filter(author_id=instance.id))
+    instance._loaded_username = instance.username
+
+
+@receiver([post_save, post_delete], sender=models.HotNews)
+def rebuild_hot_news_rank(sender, **kwargs):
+    # 热门新闻数量很少，整体重建排行
+    try:
+        rebuild_hot_list()
+    except Exception as e:
+        logger.error('热门新闻排行重建异常：\n{}'.format(e))
+
+
+@receiver(post_save, sender=models.News)
+def rebuild_hot_news_rank_on_news_save(sender, instance, **kwargs):
+    # 排行中保存了新闻标题等信息
+    try:
+        if models.HotNews.objects.filter(news_id=instance.id).exists():
+            rebuild_hot_list()
+    except Exception as e:
+        logger.error('热门新闻排行重建异常：\n{}'.format(e))
@@ -1,3 +1,490 @@
-from django.test import TestCase
+import json
+import logging
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from haystack import connections
+
+from news import clicks, images, models, search_queue, views
+from news.caches import get_news_list_version_key, get_news_article
+from news.hot_list import get_hot_news_page
+from news.comment_tree import load_comment_threads
+from news.search_backends import NewsElasticsearchSearchBackend, NewsElasticsearchSearchEngine
+from news.views import get_suggest_queryset
+from news.constants import NEWS_CLICKS_KEY, NEWS_CLICKS_PENDING_KEY, NEWS_CLICKS_FLUSH_LOCK_KEY, NEWS_INDEX_QUEUE_KEY, \
+    NEWS_INDEX_TRIGGER_KEY, NEWS_INDEX_LOCK_KEY, NEWS_IMAGE_VARIANTS_KEY
+from users.models import User
+from utils.cache_fun import get_cache_version
+from utils.paginator_script import decode_cursor, encode_cursor, get_seek_page
+from utils.redis_lock import redis_lock
+from utils.res_code import Code
+
+
+def _es_available():
+    # 只有配置了elasticsearch并且能连上时才运行需要搜索服务的测试
+    conf = settings.HAYSTACK_CONNECTIONS['default']
+    if conf['ENGINE'] != '{}.{}'.format(NewsElasticsearchSearchEngine.__module__, NewsElasticsearchSearchEngine.__name__):
+        return False
+    # 连接失败时elasticsearch客户端会打印异常，检测时不输出
+    es_logger = logging.getLogger('elasticsearch')
+    disabled, es_logger.disabled = es_logger.disabled, True
+    try:
+        return NewsElasticsearchSearchBackend('default', URL=conf['URL'], INDEX_NAME='test_suggest').conn.ping()
+    except Exception:
+        return False
+    finally:
+        es_logger.disabled = disabled
+
+
+class SuggestMappingTest(TestCase):
+    """
+    联想字段的mapping，不需要elasticsearch
+    """
+
+    def setUp(self):
+        self.backend = NewsElasticsearchSearchBackend('default', URL='http://127.0.0.1:9200/', INDEX_NAME='test_suggest')
+
+    def test_title_auto_uses_suggest_analyzer(self):
+        fields = connections['default'].get_unified_index().all_searchfields()
+        mapping = self.backend.build_mapping(fields)['modelresult']['properties']
+        self.assertEqual(mapping['title_auto']['analyzer'], 'suggest_index_analyzer')
+        self.assertEqual(mapping['title_auto']['search_analyzer'], 'suggest_search_analyzer')
+
+    def test_suggest_analyzer_keeps_single_char_prefix(self):
+        analysis = self.backend.DEFAULT_SETTINGS['settings']['analysis']
+        analyzer = analysis['analyzer']['suggest_index_analyzer']
+        # 整个标题作为一个词，中文不会被拆成单字
+        self.assertEqual(analyzer['tokenizer'], 'keyword')
+        edgengram = analysis['filter'][analyzer['filter'][-1]]
+        self.assertEqual(edgengram['min_gram'], 1)
+        # 其他字段使用的haystack默认设置不受影响
+        self.assertEqual(analysis['filter']['haystack_edgengram']['min_gram'], 2)
+
+
+@skipUnless(_es_available(), 'elasticsearch不可用')
+class SuggestSearchTest(TestCase):
+    """
+    在临时索引中索引中文标题，用前缀搜索
+    """
+
+    def setUp(self):
+        conf = settings.HAYSTACK_CONNECTIONS['default']
+        self.backend = NewsElasticsearchSearchBackend('default', URL=conf['URL'], INDEX_NAME='test_suggest')
+        self.backend.silently_fail = False
+        self.backend.conn.indices.delete(index='test_suggest', ignore=404)
+        self.backend.setup()
+
+        author = User.objects.create_user(username='suggest', password='suggest', mobile='13800000000')
+        tag = models.Tag.objects.create(name='测试')
+        self.news = models.News.objects.create(title='中文标题联想', digest='摘要', content='正文', tag=tag,
+                                               author=author)
+        index = connections['default'].get_unified_index().get_index(models.News)
+        self.backend.update(index, [self.news])
+        self.backend.conn.indices.refresh(index='test_suggest')
+
+    def tearDown(self):
+        self.backend.conn.indices.delete(index='test_suggest', ignore=404)
+
+    def suggest(self, query):
+        query_string = get_suggest_queryset(query).query.build_query()
+        return [int(result.pk) for result in self.backend.search(query_string)['results']]
+
+    def test_chinese_prefix(self):
+        self.assertEqual(self.suggest('中'), [self.news.id])
+        self.assertEqual(self.suggest('中文'), [self.news.id])
+
+    def test_not_prefix(self):
+        self.assertEqual(self.suggest('标题'), [])
+
+
+class NewsTestCase(TestCase):
+    """
+    创建测试用的作者、标签、新闻，每个测试前清空fakeredis
+    """
+
+    def setUp(self):
+        get_redis_connection('default').flushall()
+        self.author = User.objects.create_user(username='author', password='author', mobile='13800000001')
+        self.tag = models.Tag.objects.create(name='测试')
+        self.news = self.create_news('新闻')
+
+    def create_news(self, title, **kwargs):
+        return models.News.objects.create(title=title, digest='摘要', content='正文', tag=self.tag,
+                                          author=self.author, **kwargs)
+
+    def create_comment(self, content, parent=None, is_delete=False):
+        return models.Comments.objects.create(content=content, news=self.news, author=self.author, parent=parent,
+                                              is_delete=is_delete)
+
+
+class CommentTreeTest(NewsTestCase):
+
+    def test_root_id(self):
+        root = self.create_comment('顶层')
+        reply = self.create_comment('回复', parent=root)
+        reply_reply = self.create_comment('回复的回复', parent=reply)
+        self.assertIsNone(root.root_id)
+        self.assertEqual(reply.root_id, root.id)
+        self.assertEqual(reply_reply.root_id, root.id)
+
+    def test_nested_replies(self):
+        root = self.create_comment('顶层')
+        reply = self.create_comment('回复', parent=root)
+        self.create_comment('回复的回复', parent=reply)
+        threads, next_cursor = load_comment_threads(self.news.id)
+        self.assertIsNone(next_cursor)
+        self.assertEqual(len(threads), 1)
+        self.assertEqual(threads[0]['content'], '顶层')
+        child = threads[0]['children'][0]
+        self.assertEqual(child['content'], '回复')
+        self.assertEqual(child['parent']['content'], '顶层')
+        self.assertEqual(child['children'][0]['parent']['comment_id'], reply.id)
+
+    def test_one_query_for_replies(self):
+        parent = self.create_comment('顶层')
+        for i in range(10):
+            parent = self.create_comment('回复{}'.format(i), parent=parent)
+        # 顶层评论一次，全部回复一次，和嵌套层数无关
+        with self.assertNumQueries(2):
+            threads, _ = load_comment_threads(self.news.id)
+        depth = 0
+        node = threads[0]
+        while node['children']:
+            node = node['children'][0]
+            depth += 1
+        self.assertEqual(depth, 10)
+
+    def test_deleted_comment_placeholder(self):
+        root = self.create_comment('顶层', is_delete=True)
+        reply = self.create_comment('回复', parent=root, is_delete=True)
+        self.create_comment('回复的回复', parent=reply)
+        threads, _ = load_comment_threads(self.news.id)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0]['deleted'])
+        self.assertEqual(threads[0]['content'], '原评论已删除')
+        grandchild = threads[0]['children'][0]['children'][0]
+        self.assertEqual(grandchild['content'], '回复的回复')
+        self.assertEqual(grandchild['parent']['content'], '原评论已删除')
+
+    def test_prune_deleted_replies(self):
+        root = self.create_comment('顶层')
+        reply = self.create_comment('回复', parent=root, is_delete=True)
+        self.create_comment('回复的回复', parent=reply, is_delete=True)
+        threads, _ = load_comment_threads(self.news.id)
+        self.assertEqual(threads[0]['children'], [])
+
+    def test_cursor_skips_deleted_threads(self):
+        first = self.create_comment('1')
+        deleted = self.create_comment('2', is_delete=True)
+        self.create_comment('2的回复', parent=deleted, is_delete=True)
+        third = self.create_comment('3')
+        fourth = self.create_comment('4')
+
+        threads, next_cursor = load_comment_threads(self.news.id, limit=2)
+        self.assertEqual([t['comment_id'] for t in threads], [fourth.id, third.id])
+        self.assertEqual(next_cursor, third.id)
+        # 全部回复都已删除的评论串不占用分页名额
+        threads, next_cursor = load_comment_threads(self.news.id, cursor=next_cursor, limit=2)
+        self.assertEqual([t['comment_id'] for t in threads], [first.id])
+        self.assertIsNone(next_cursor)
+
+    def test_no_empty_page_with_cursor(self):
+        self.create_comment('1')
+        for i in range(3):
+            self.create_comment('已删除{}'.format(i), is_delete=True)
+        threads, next_cursor = load_comment_threads(self.news.id, limit=1)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNone(next_cursor)
+
+
+class NewsClicksTest(NewsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.con_redis = get_redis_connection('default')
+        self.other_news = self.create_news('新闻2')
+
+    def test_flush_clicks(self):
+        for _ in range(3):
+            clicks.incr_news_clicks(self.news.id)
+        clicks.incr_news_clicks(self.other_news.id)
+        self.assertEqual(clicks.flush_news_clicks(), 2)
+        # 一条UPDATE中按id分别累加
+        self.assertEqual(models.News.objects.get(id=self.news.id).clicks, 3)
+        self.assertEqual(models.News.objects.get(id=self.other_news.id).clicks, 1)
+        self.assertFalse(self.con_redis.exists(NEWS_CLICKS_KEY, NEWS_CLICKS_PENDING_KEY))
+        self.assertFalse(self.con_redis.exists(NEWS_CLICKS_FLUSH_LOCK_KEY))
+        self.assertEqual(clicks.flush_news_clicks(), 0)
+
+    @override_settings(NEWS_CLICKS_MAX_PENDING=2)
+    def test_max_pending(self):
+        self.assertFalse(clicks.incr_news_clicks(self.news.id))
+        self.assertTrue(clicks.incr_news_clicks(self.news.id))
+        self.assertFalse(clicks.incr_news_clicks(self.news.id))
+
+    def test_restore_on_failure(self):
+        clicks.incr_news_clicks(self.news.id)
+        clicks.incr_news_clicks(self.news.id)
+        with mock.patch.object(clicks, '_update_clicks', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                clicks.flush_news_clicks()
+        self.assertEqual(self.con_redis.hget(NEWS_CLICKS_KEY, self.news.id), b'2')
+        self.assertEqual(self.con_redis.get(NEWS_CLICKS_PENDING_KEY), b'2')
+        self.assertEqual(clicks.flush_news_clicks(), 1)
+        self.assertEqual(models.News.objects.get(id=self.news.id).clicks, 2)
+
+    def test_locked(self):
+        clicks.incr_news_clicks(self.news.id)
+        self.con_redis.set(NEWS_CLICKS_FLUSH_LOCK_KEY, 'other')
+        self.assertEqual(clicks.flush_news_clicks(), 0)
+        # 不能删除其他任务的锁
+        self.assertEqual(self.con_redis.get(NEWS_CLICKS_FLUSH_LOCK_KEY), b'other')
+
+    def test_expired_lock_not_released(self):
+        with redis_lock(self.con_redis, 'test_lock', 60) as locked:
+            self.assertTrue(locked)
+            # 锁过期后被其他任务取得
+            self.con_redis.set('test_lock', 'other')
+        self.assertEqual(self.con_redis.get('test_lock'), b'other')
+
+
+class NewsIndexQueueTest(NewsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.con_redis = get_redis_connection('default')
+        # 保存新闻时放入队列的id不影响下面的测试
+        self.con_redis.delete(NEWS_INDEX_QUEUE_KEY, NEWS_INDEX_TRIGGER_KEY)
+        self.backend = mock.Mock(spec=['update', 'remove'])
+        patcher = mock.patch.object(connections['default'], 'get_backend', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_enqueue_triggers_once(self):
+        self.assertTrue(search_queue.enqueue_news_index([1, 2]))
+        self.assertFalse(search_queue.enqueue_news_index([3]))
+        self.assertEqual(self.con_redis.scard(NEWS_INDEX_QUEUE_KEY), 3)
+
+    def test_process_queue(self):
+        self.news.is_delete = True
+        self.news.save()
+        other_news = self.create_news('新闻2')
+        search_queue.enqueue_news_index([self.news.id, other_news.id, 0])
+        self.assertEqual(search_queue.process_news_index_queue(), 3)
+        # 存在的新闻更新索引，逻辑删除和不存在的新闻从索引中删除
+        updated = list(self.backend.update.call_args[0][1])
+        self.assertEqual([news.id for news in updated], [other_news.id])
+        removed = {call[0][0] for call in self.backend.remove.call_args_list}
+        self.assertEqual(removed, {'news.news.{}'.format(self.news.id), 'news.news.0'})
+        self.assertFalse(self.con_redis.exists(NEWS_INDEX_QUEUE_KEY, NEWS_INDEX_LOCK_KEY))
+
+    def test_requeue_on_failure(self):
+        search_queue.enqueue_news_index([self.news.id])
+        self.backend.update.side_effect = IOError
+        with self.assertRaises(IOError):
+            search_queue.process_news_index_queue()
+        self.assertEqual(self.con_redis.smembers(NEWS_INDEX_QUEUE_KEY), {str(self.news.id).encode()})
+        self.assertFalse(self.con_redis.exists(NEWS_INDEX_LOCK_KEY))
+
+    def test_locked(self):
+        search_queue.enqueue_news_index([self.news.id])
+        self.con_redis.set(NEWS_INDEX_LOCK_KEY, 'other')
+        self.assertEqual(search_queue.process_news_index_queue(), 0)
+        self.assertEqual(self.con_redis.get(NEWS_INDEX_LOCK_KEY), b'other')
+        self.assertEqual(self.con_redis.scard(NEWS_INDEX_QUEUE_KEY), 1)
+
+
+class NewsListTest(NewsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(4):
+            self.create_news('新闻{}'.format(i))
+
+    def test_cursor(self):
+        update_time = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(update_time, 12)), (update_time, 12))
+        for cursor in ('', 'abc', encode_cursor(update_time, 1)[:-2] + '!!'):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_seek_page(self):
+        # 修改时间相同的新闻按id排序，翻页时不重复也不遗漏
+        models.News.objects.update(update_time=timezone.now())
+        expected = list(models.News.objects.order_by('-update_time', '-id').values_list('id', flat=True))
+        ids = []
+        cursor = None
+        while True:
+            items, cursor = get_seek_page(models.News.objects.all(), cursor, 2)
+            ids.extend(item.id for item in items)
+            if cursor is None:
+                break
+        self.assertEqual(ids, expected)
+
+    def test_cursor_api(self):
+        res = self.client.get('/news/', {'cursor': '', 'with_total': 1}).json()['data']
+        self.assertEqual(len(res['news']), 5)
+        self.assertEqual(res['total_pages'], 1)
+        self.assertIsNone(res['next_cursor'])
+        res = self.client.get('/news/', {'cursor': 'bad'}).json()
+        self.assertEqual(res['errno'], Code.PARAMERR)
+
+    def test_page_out_of_range(self):
+        cache_keys = []
+        original = views.get_json_response_cached
+
+        def record(request, cache_key, *args, **kwargs):
+            cache_keys.append(cache_key)
+            return original(request, cache_key, *args, **kwargs)
+
+        with mock.patch.object(views, 'get_json_response_cached', side_effect=record):
+            for page in (1, 2, 999999, -1):
+                self.client.get('/news/', {'page': page})
+        # 超出范围的页码使用最后一页（第一页）的缓存
+        self.assertEqual(set(cache_keys), {'news_list:0:page:1'})
+
+    def test_username_change_invalidates_list(self):
+        version = get_cache_version(get_news_list_version_key(self.tag.id))
+        all_version = get_cache_version(get_news_list_version_key(0))
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertGreater(get_cache_version(get_news_list_version_key(self.tag.id)), version)
+        self.assertGreater(get_cache_version(get_news_list_version_key(0)), all_version)
+        res = self.client.get('/news/', {'page': 1}).json()['data']
+        self.assertEqual({news['author'] for news in res['news']}, {'renamed'})
+
+
+class RenameInvalidateTest(NewsTestCase):
+
+    def test_tag_rename(self):
+        models.HotNews.objects.create(news=self.news)
+        self.assertIn('测试', get_news_article(self.news.id)[0]['html'])
+        self.tag.name = '改名'
+        self.tag.save()
+        article, cached = get_news_article(self.news.id)
+        self.assertFalse(cached)
+        self.assertIn('改名', article['html'])
+        self.assertEqual(get_hot_news_page(0, 10)[1][0]['tag_name'], '改名')
+
+    def test_username_change(self):
+        models.HotNews.objects.create(news=self.news)
+        self.assertIn('author', get_news_article(self.news.id)[0]['html'])
+        self.author.username = 'renamed'
+        self.author.save()
+        article, cached = get_news_article(self.news.id)
+        self.assertFalse(cached)
+        self.assertIn('renamed', article['html'])
+        self.assertEqual(get_hot_news_page(0, 10)[1][0]['author'], 'renamed')
+
+    def test_other_change_keeps_cache(self):
+        get_news_article(self.news.id)
+        self.author.save()
+        self.tag.save()
+        self.assertTrue(get_news_article(self.news.id)[1])
+
+
+class IndexBundleTest(NewsTestCase):
+
+    def test_bundle(self):
+        models.HotNews.objects.create(news=self.news)
+        data = self.client.get('/news/bundle/').json()['data']
+        self.assertEqual(data['tags'], [{'id': self.tag.id, 'name': '测试'}])
+        self.assertEqual([news['id'] for news in data['hot_news']], [self.news.id])
+        self.assertEqual([news['id'] for news in data['news_list']['news']], [self.news.id])
+
+    def test_index_shares_bundle_cache(self):
+        models.HotNews.objects.create(news=self.news)
+        res = self.client.get('/')
+        self.assertContains(res, '测试')
+        # 页面已经查询过的数据，合并接口直接从缓存中读取
+        with self.assertNumQueries(0):
+            self.client.get('/news/bundle/')
+
+
+class ReindexRemoveStaleTest(NewsTestCase):
+
+    def test_remove_stale_news(self):
+        from news.management.commands.reindex_news import Command
+        deleted = self.create_news('已删除', is_delete=True)
+        hits = [{'_id': 'news.news.{}'.format(news_id)} for news_id in (self.news.id, deleted.id, 999998, 999999)]
+        backend = mock.Mock()
+        index = connections['default'].get_unified_index().get_index(models.News)
+        with mock.patch('elasticsearch.helpers.scan', return_value=iter(hits)), \
+                mock.patch('news.management.commands.reindex_news.remove_news_from_index') as remove:
+            removed = Command().remove_stale_news(backend, 'news_new', index, 'default', 2)
+        self.assertEqual(removed, 3)
+        # 每批分别和数据库比较后删除
+        self.assertEqual([c[0][1] for c in remove.call_args_list], [[deleted.id], [999998, 999999]])
+
+
+class ImageVariantsTest(NewsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.image_url = settings.FASTDFS_SERVER_DOMAIN + '/group1/M00/00/00/a.png'
+        self.variants = {'thumb': settings.FASTDFS_SERVER_DOMAIN + '/group1/M00/00/00/b.jpg'}
+
+    def test_make_image_variants(self):
+        with mock.patch.object(images, 'build_image_variants', return_value=self.variants) as build:
+            self.assertEqual(images.make_image_variants(self.image_url), self.variants)
+            # 已经生成过的不再处理，redis缓存丢失后从数据库读取
+            get_redis_connection('default').flushall()
+            self.assertEqual(images.make_image_variants(self.image_url), self.variants)
+        build.assert_called_once_with(self.image_url)
+        self.assertEqual(json.loads(models.ImageVariants.objects.get(image_url=self.image_url).variants),
+                         self.variants)
+
+    def test_get_image_variants(self):
+        models.ImageVariants.objects.create(image_url=self.image_url, variants=json.dumps(self.variants))
+        urls = [self.image_url, settings.FASTDFS_SERVER_DOMAIN + '/group1/M00/00/00/c.png', 'http://example.com/a.png']
+        self.assertEqual(images.get_image_variants(urls), {self.image_url: self.variants})
+        # 数据库中查到的写入redis缓存，之后不再查询数据库
+        self.assertTrue(get_redis_connection('default').hexists(NEWS_IMAGE_VARIANTS_KEY, self.image_url))
+        with self.assertNumQueries(0):
+            self.assertEqual(images.get_image_variants([self.image_url]), {self.image_url: self.variants})
+
+
+class CommentCountTest(NewsTestCase):
+
+    def assertCommentCount(self, count):
+        self.news.refresh_from_db(fields=['comment_count'])
+        self.assertEqual(self.news.comment_count, count)
+
+    def test_create(self):
+        root = self.create_comment('顶层')
+        self.create_comment('回复', parent=root)
+        self.create_comment('已删除', is_delete=True)
+        self.assertCommentCount(2)
+
+    def test_soft_delete_and_restore(self):
+        comment = self.create_comment('评论')
+        comment.is_delete = True
+        comment.save()
+        self.assertCommentCount(0)
+        # 重复保存不会重复减少
+        comment.save()
+        self.assertCommentCount(0)
+        comment = models.Comments.objects.get(id=comment.id)
+        comment.is_delete = False
+        comment.save()
+        self.assertCommentCount(1)
+
+    def test_hard_delete(self):
+        comment = self.create_comment('评论')
+        deleted = self.create_comment('已删除', is_delete=True)
+        deleted.delete()
+        self.assertCommentCount(1)
+        comment.delete()
+        self.assertCommentCount(0)
+
+    def test_partial_load(self):
+        comment = self.create_comment('评论')
+        # 没有加载is_delete字段时无法判断是否变化，评论数不变
+        comment = models.Comments.objects.only('content').get(id=comment.id)
+        comment.content = '修改'
+        comment.save()
+        self.assertCommentCount(1)
@@ -6,7 +6,9 @@ urlpatterns = [
     path('',views.IndexView.as_view(),name='index'),
     path('news/',views.NewsListView.as_view(),name='news_list'),
     path('news/banners/',views.NewsBannerView.as_view(),name='news_banner'),
+    path('news/bundle/',views.NewsBundleView.as_view(),name='news_bundle'),
     path('news/<int:news_id>/',views.NewsDetailView.as_view(), name='news_detail'),
     path('news/<int:news_id>/comments/', views.NewsCommentView.as_view(), name='news_comment'),
-    path ('search/', views.SearchView(), name='search'),
+    path ('search/', views.SearchView(load_all=False), name='search'),
+    path('search/suggest/', views.NewsSuggestView.as_view(), name='search_suggest'),
 ]
\ No newline at end of file
@@ -1,40 +1,46 @@
 import logging
 import json
+import hashlib
+import math
+from functools import partial
 
 from django.shortcuts import render
 from django.views import View
 from django.http import Http404
+from django.core.cache import cache
 # 分页
-from django.core.paginator import Paginator,EmptyPage,PageNotAnInteger
+from django.core.paginator import Paginator,InvalidPage
 
 from dj_web import settings
 from news import models
 
 from haystack.views import SearchView as _SearchView
+from haystack.query import SearchQuerySet
+from haystack.inputs import Exact
 
-from .constants import PER_PAGE_NEWS_COUNT,SHOW_HOTNEWS_COUNT,SHOW_BANNER_COUNT
+from .constants import PER_PAGE_NEWS_COUNT,NEWS_TOTAL_PAGES_CACHE_EXPIRES,\
+    NEWS_LIST_CACHE_EXPIRES,NEWS_SEARCH_VERSION_KEY,NEWS_SEARCH_CACHE_EXPIRES,NEWS_SUGGEST_COUNT,\
+    NEWS_SUGGEST_CACHE_EXPIRES,NEWS_SUGGEST_MAX_AGE,INDEX_CACHE_VERSION_KEY,INDEX_CACHE_EXPIRES
+from .caches import get_index_tags,get_index_hot_news,get_index_banners,get_news_list_version_key,get_news_article,render_news_article
+from .clicks import incr_news_clicks
+from .comment_tree import load_comment_threads
+from .hot_list import get_hot_news_page
+from .images import get_image_variants, image_variant_urls
 from utils.json_fun import to_json_data
 from utils.res_code import Code,error_map
+from utils.paginator_script import get_seek_page,decode_cursor,PrefilledPageList
+from utils.cache_fun import get_json_response_cached,get_or_set_versioned
 
 # django日志器
 logger=logging.getLogger('django')
 
 class IndexView(View):
     def get(self,request):
-        # 查询数据，优化只查询id和name字段
-        tags=models.Tag.objects.only('id','name').filter(is_delete=False)
-        # 查询数据拼接两张表
-        hot_news=models.HotNews.objects.select_related('news').only(
-            'news__title',
-            'news__image_url',
-            'news_id'
-        ).filter(is_delete=False).order_by('priority','-news__clicks')[0:SHOW_HOTNEWS_COUNT] # 排序切片
-
-        # 排除字段
-        # tags=models.Tag.objects.defer('create_time','update_time').filter(is_delete=False)
-        # context = {
-        #     'tags': tags
-        # }
+        # 和首页合并接口读取同一份缓存，页面和接口先后请求时只查询一次数据库
+        bundle = get_index_bundle_data()
+        tags = bundle['tags']
+        # 模板中依然使用 i.news.title
+        hot_news = [{'news': news} for news in bundle['hot_news']]
         # locals函数会以字典类型返回当前位置的全部局部变量。
         return render(request,'news/index.html',locals())
 
@@ -55,73 +61,146 @@ class NewsListView(View):
         except Exception as e:
             logger.error('页码错误：\n{}'.format(e))
             page=1
-        # 需要查询的数据：title,
-        # 数据库查询数据,关联多表查询优化
-        new_queryset = models.News.objects.select_related('tag','author').only(
-            'title',
-            'digest',
-            'image_url',
-            'update_time',
-            # 关联查询字段
-            'tag__name',
-            'author__username'
-        )
-        # 数据查询
-        news = new_queryset.filter(is_delete=False,tag_id=tag_id) or new_queryset.filter(is_delete=False)
-        # 分页:数据,每页多少条数据
-        paginator = Paginator(news,PER_PAGE_NEWS_COUNT)
-        # 获取某页数据
-        try:
-            news_info=paginator.page(page)
-        except Exception:
-            logger.error('访问页数大于总页数')
-            # 获取最后一页数据
-            news_info = paginator.page(paginator.num_pages)
-        # 序列化输出,符合前端规定好的格式
-        '''
-        {
-            "data": {
-                "total_pages": 61,
-                "news": [
-                    {
-                        "digest": "在python用import或者from...import或者from...import...as...来导入相应的模块，作用和使用方法与C语言的include头文件类似。其实就是引入...",
-                        "title": "import方法引入模块详解",
-                        "author": "python",
-                        "image_url": "/media/jichujiaochen.jpeg",
-                        "tag_name": "Python基础",
-                        "update_time": "2018年12月17日 14:48"
-                    },
-                    {
-                        "digest": "如果你原来是一个php程序员，你对于php函数非常了解（PS：站长原来就是一个php程序员），但是现在由于工作或者其他原因要学习python，但是p...",
-                        "title": "给曾经是phper的程序员推荐个学习网站",
-                        "author": "python",
-                        "image_url": "/media/jichujiaochen.jpeg",
-                        "tag_name": "Python基础",
-                        "update_time": "2018年12月17日 14:48"
-                    }
-                ]
-            },
-            "errno": "0",
-            "errmsg": ""
-        }
-       '''
-        news_info_list=[]
-        for n in news_info:
-            news_info_list.append({
-                'id':n.id,
-                'title': n.title,
-                'digest': n.digest,
-                'image_url': n.image_url,
-                'tag_name': n.tag.name,
-                'author': n.author.username,
-                # 格式化输出时间
-                'update_time': n.update_time.strftime('%Y年%m月%d日 %H:%M'),
-            })
-        data={
-            'news':news_info_list,
-            'total_pages':paginator.num_pages,
+        # 携带cursor参数时使用游标分页，page参数继续兼容旧的前端
+        cursor = request.GET.get('cursor')
+        if cursor is not None:
+            if cursor:
+                try:
+                    decode_cursor(cursor)
+                except ValueError as e:
+                    logger.error('游标错误：\n{}'.format(e))
+                    return to_json_data(errno=Code.PARAMERR, errmsg=error_map[Code.PARAMERR])
+            with_total = bool(request.GET.get('with_total'))
+            cache_key = 'news_list:{}:cursor:{}:{}'.format(tag_id, cursor, int(with_total))
+            builder = partial(get_news_cursor_data, tag_id, cursor, with_total)
+        else:
+            # 超出范围的页码都按最后一页缓存，不能每个页码都生成一个缓存
+            total_pages = get_total_pages_estimate(get_news_queryset(tag_id), tag_id)
+            page = min(max(page, 1), total_pages)
+            cache_key = 'news_list:{}:page:{}'.format(tag_id, page)
+            builder = partial(get_news_page_data, tag_id, page)
+        # 返回缓存中编码好的json，标签下的新闻修改时对应标签的缓存失效
+        return get_json_response_cached(request, cache_key, get_news_list_version_key(tag_id), builder,
+                                        NEWS_LIST_CACHE_EXPIRES, stat_name='news_list')
+
+
+def get_news_queryset(tag_id):
+    # 需要查询的数据：title,
+    # 数据库查询数据,关联多表查询优化
+    new_queryset = models.News.objects.select_related('tag','author').only(
+        'title',
+        'digest',
+        'image_url',
+        'update_time',
+        # 关联查询字段
+        'tag__name',
+        'author__username'
+    )
+    # 数据查询，标签id为0时查询全部标签的新闻
+    # 由参数决定查询条件，不需要先执行查询判断结果是否为空
+    news = new_queryset.filter(is_delete=False)
+    if tag_id:
+        news = news.filter(tag_id=tag_id)
+    return news
+
+
+def get_news_page_data(tag_id, page):
+    """
+    页码分页数据
+    """
+    news = get_news_queryset(tag_id)
+    # 分页:数据,每页多少条数据
+    paginator = Paginator(news,PER_PAGE_NEWS_COUNT)
+    # 获取某页数据
+    try:
+        news_info=paginator.page(page)
+    except Exception:
+        logger.error('访问页数大于总页数')
+        # 获取最后一页数据
+        news_info = paginator.page(paginator.num_pages)
+    # 序列化输出,符合前端规定好的格式
+    '''
+    {
+        "data": {
+            "total_pages": 61,
+            "news": [
+                {
+                    "digest": "在python用import或者from...import或者from...import...as...来导入相应的模块，作用和使用方法与C语言的include头文件类似。其实就是引入...",
+                    "title": "import方法引入模块详解",
+                    "author": "python",
+                    "image_url": "/media/jichujiaochen.jpeg",
+                    "tag_name": "Python基础",
+                    "update_time": "2018年12月17日 14:48"
+                },
+                {
+                    "digest": "如果你原来是一个php程序员，你对于php函数非常了解（PS：站长原来就是一个php程序员），但是现在由于工作或者其他原因要学习python，但是p...",
+                    "title": "给曾经是phper的程序员推荐个学习网站",
+                    "author": "python",
+                    "image_url": "/media/jichujiaochen.jpeg",
+                    "tag_name": "Python基础",
+                    "update_time": "2018年12月17日 14:48"
+                }
+            ]
+        },
+        "errno": "0",
+        "errmsg": ""
+    }
+   '''
+    return {
+        'news':news_to_list(news_info),
+        'total_pages':paginator.num_pages,
+    }
+
+
+def get_news_cursor_data(tag_id, cursor, with_total=False):
+    """
+    游标分页数据，返回下一页游标next_cursor，为null时表示没有更多数据
+    with_total为True时额外返回总页数估算值
+    """
+    news = get_news_queryset(tag_id)
+    news_info, next_cursor = get_seek_page(news, cursor, PER_PAGE_NEWS_COUNT)
+    data = {
+        'news': news_to_list(news_info),
+        'next_cursor': next_cursor,
+    }
+    if with_total:
+        data['total_pages'] = get_total_pages_estimate(news, tag_id)
+    return data
+
+
+def news_to_list(news_info):
+    """
+    新闻列表序列化，图片使用列表缩略图
+    """
+    news_info = list(news_info)
+    variants = get_image_variants(n.image_url for n in news_info)
+    news_info_list=[]
+    for n in news_info:
+        item = {
+            'id':n.id,
+            'title': n.title,
+            'digest': n.digest,
+            'tag_name': n.tag.name,
+            'author': n.author.username,
+            # 格式化输出时间
+            'update_time': n.update_time.strftime('%Y年%m月%d日 %H:%M'),
         }
-        return to_json_data(data=data)
+        # image_url、image_webp_url
+        item.update(image_variant_urls(variants, n.image_url, 'thumb'))
+        news_info_list.append(item)
+    return news_info_list
+
+
+def get_total_pages_estimate(news, tag_id):
+    """
+    总页数估算值，COUNT结果单独缓存，过期前新增的文章不会计入
+    """
+    cache_key = 'news_total_pages_{}'.format(tag_id)
+    total_pages = cache.get(cache_key)
+    if total_pages is None:
+        total_pages = max(math.ceil(news.count() / PER_PAGE_NEWS_COUNT), 1)
+        cache.set(cache_key, total_pages, NEWS_TOTAL_PAGES_CACHE_EXPIRES)
+    return total_pages
 
 # 轮播图
 class NewsBannerView(View):
@@ -129,46 +208,71 @@ class NewsBannerView(View):
     轮播图，ajax传参，前后端分离
     """
     def get(self,request):
-        # 数据库查询
-        banners=models.Banner.objects.select_related('news').only('image_url','news_id','news__title').\
-            filter(is_delete=False).order_by('priority')[0:SHOW_BANNER_COUNT]
-        # 序列化输出
-        banners_info_list=[]
-        for i in banners:
-            banners_info_list.append(
-                {
-                    'image_url':i.image_url,
-                    'news_id':i.news_id,
-                    'news_title':i.news.title,
-                }
-            )
+        # 从首页缓存中读取，轮播图修改时失效
         data={
-            'banners':banners_info_list
+            'banners':get_index_banners()
         }
         return to_json_data(data=data)
 
+
+class NewsBundleView(View):
+    """
+    首页数据合并接口，一次请求返回标签、轮播图、热门新闻和第一页新闻列表
+    /news/bundle/
+    """
+    def get(self,request):
+        # 整个响应体缓存在redis中，首页数据或新闻修改时版本号加一
+        return get_json_response_cached(request,'index_bundle',INDEX_CACHE_VERSION_KEY,get_index_bundle_data,
+                                        INDEX_CACHE_EXPIRES,stat_name='index_bundle')
+
+
+def get_index_bundle_data():
+    # 首页页面（IndexView）和合并接口共用
+    return get_or_set_versioned('index_bundle_data',INDEX_CACHE_VERSION_KEY,_build_index_bundle_data,
+                                INDEX_CACHE_EXPIRES,stat_name='index_bundle_data')
+
+
+def _build_index_bundle_data():
+    return {
+        'tags': get_index_tags(),
+        'banners': get_index_banners(),
+        'hot_news': [i['news'] for i in get_index_hot_news()],
+        # 第一页使用游标分页，后续页面继续请求新闻列表接口
+        'news_list': get_news_cursor_data(0, None),
+    }
+
 # 标签页面
 class NewsDetailView(View):
     """
     /news/<int:news_id>/
     """
     def get(self,request,news_id):
-        # 关联查询字段名
-        news=models.News.objects.select_related('tag','author').only('title','content','update_time','tag__name','author__username').\
-            filter(is_delete=False,id=news_id).first()
-        if news:
-            # 评论信息
-            comments = models.Comments.objects.select_related('author','parent').only('content','update_time','author__username','parent__content','parent__author__username','parent__update_time').\
-                filter(is_delete=False,news_id=news_id)
-
-            # 序列化输出
-            comments_list=[]
-            for comm in comments:
-                # 调用模型类中的序列化方法
-                comments_list.append(comm.to_dict_data())
-            i=len(comments_list)
-
-            return render(request ,'news/news_detail.html',locals())
+        # 文章部分缓存渲染好的html，管理员不走缓存，修改后可以马上看到效果
+        if request.user.is_staff:
+            article, cache_status = render_news_article(news_id), 'bypass'
+        else:
+            article, hit = get_news_article(news_id)
+            cache_status = 'hit' if hit else 'miss'
+        if article:
+            # 点击量先累加到redis中，由定时任务批量写库
+            try:
+                if incr_news_clicks(news_id):
+                    # 在函数中导入，避免django初始化时导入celery
+                    from celery_tasks.news import tasks as news_tasks
+                    news_tasks.flush_news_clicks.delay()
+            except Exception as e:
+                logger.error('点击量统计异常：\n{}'.format(e))
+            # 评论信息，页面中只包含第一页评论，后面的评论由前端通过评论接口加载
+            comments_list, next_cursor = load_comment_threads(news_id)
+            # 评论数直接读取新闻表中维护的计数
+            i = models.News.objects.filter(id=news_id).values_list('comment_count',flat=True).first()
+
+            response = render(request ,'news/news_detail.html',locals())
+            response['X-Article-Cache'] = cache_status
+            if cache_status == 'hit':
+                # 命中缓存节省的查询和渲染时间
+                response['X-Render-Time-Saved'] = '{}ms'.format(article['render_ms'])
+            return response
         else:
             raise Http404('新闻{}不存在'.format(news_id))
 
@@ -177,6 +281,24 @@ class NewsCommentView(View):
     """
     /news/<int:news_id>/comments/
     """
+    def get(self,request,news_id):
+        """
+        游标分页获取评论，最新的在前
+        ?cursor=上一页返回的next_cursor
+        """
+        try:
+            cursor = int(request.GET.get('cursor') or 0)
+        except Exception as e:
+            logger.error('评论游标错误：\n{}'.format(e))
+            return to_json_data(errno=Code.PARAMERR, errmsg=error_map[Code.PARAMERR])
+        if not models.News.objects.only('id').filter(is_delete=False,id=news_id).exists():
+            return to_json_data(errno=Code.PARAMERR,errmsg='新闻不存在')
+        comments_list, next_cursor = load_comment_threads(news_id, cursor)
+        return to_json_data(data={
+            'comments': comments_list,
+            'next_cursor': next_cursor,
+        })
+
     def post(self,request,news_id):
         # 判读用户是否登录
         if not request.user.is_authenticated:
@@ -227,26 +349,97 @@ class SearchView(_SearchView):
     # 模版文件
     template = 'news/search.html'
 
+    def get_query(self):
+        # 统一大小写和空白，写法不同的相同查询共用一份缓存
+        query = ' '.join(super(SearchView, self).get_query().lower().split())
+        if query:
+            self.form.cleaned_data['q'] = query
+        return query
+
+    def build_page(self):
+        # 每页搜索结果缓存在redis中，索引更新时失效
+        try:
+            page_no = int(self.request.GET.get('page', 1))
+        except (TypeError, ValueError):
+            raise Http404('页码格式错误')
+        if page_no < 1:
+            raise Http404('页码必须大于0')
+
+        cache_key = 'news_search:{}:{}'.format(hashlib.md5(self.query.encode('utf8')).hexdigest(), page_no)
+        data = get_or_set_versioned(cache_key, NEWS_SEARCH_VERSION_KEY, partial(self.get_page_data, page_no),
+                                    NEWS_SEARCH_CACHE_EXPIRES, stat_name='search')
+        paginator = Paginator(PrefilledPageList(data['count'], data['offset'], data['results']), self.results_per_page)
+        try:
+            page = paginator.page(page_no)
+        except InvalidPage:
+            raise Http404('页码{}不存在'.format(page_no))
+        return paginator, page
+
+    def get_page_data(self, page_no):
+        start = (page_no - 1) * self.results_per_page
+        # 切片时才请求elasticsearch，总条数在同一次请求中返回
+        results = self.results[start:start + self.results_per_page]
+        return {
+            'count': self.results.count(),
+            'offset': start,
+            # 只保留索引中保存的字段
+            'results': [dict(result.get_stored_fields(), pk=result.pk) for result in results],
+        }
+
     # 重写响应方式，如果请求参数q为空，返回模型News的热门新闻数据，否则根据参数q搜索相关数据
     def create_response(self):
         kw = self.request.GET.get('q', '')
         if not kw:
             show_all = True
-            hot_news = models.HotNews.objects.select_related('news'). \
-                only('news__title', 'news__image_url', 'news__id'). \
-                filter(is_delete=False).order_by('priority', '-news__clicks')
-
-            paginator = Paginator(hot_news, settings.HAYSTACK_SEARCH_RESULTS_PER_PAGE)
+            per_page = settings.HAYSTACK_SEARCH_RESULTS_PER_PAGE
             try:
-                page = paginator.page(int(self.request.GET.get('page', 1)))
-            except PageNotAnInteger:
+                page_no = max(int(self.request.GET.get('page', 1)), 1)
+            except (TypeError, ValueError):
                 # 如果参数page的数据类型不是整型，则返回第一页数据
-                page = paginator.page(1)
-            except EmptyPage:
+                page_no = 1
+            # 热门新闻排行保存在redis有序集合中，只读取当前页
+            total, hot_news = get_hot_news_page((page_no - 1) * per_page, per_page)
+            if not hot_news and page_no > 1:
                 # 用户访问的页数大于实际页数，则返回最后一页的数据
-                page = paginator.page(paginator.num_pages)
+                page_no = max(math.ceil(total / per_page), 1)
+                total, hot_news = get_hot_news_page((page_no - 1) * per_page, per_page)
+
+            paginator = Paginator(PrefilledPageList(total, (page_no - 1) * per_page, hot_news), per_page)
+            page = paginator.page(page_no)
             return render(self.request, self.template, locals())
         else:
             show_all = False
             qs = super(SearchView, self).create_response()
-            return qs
\ No newline at end of file
+            return qs
+
+class NewsSuggestView(View):
+    """
+    搜索联想
+    /search/suggest/?q=
+    返回：{'suggestions': [{'id': 新闻id, 'title': 标题}]}
+    """
+    def get(self, request):
+        # 和搜索使用相同的规范化方式
+        query = ' '.join(request.GET.get('q', '').lower().split())
+        if not query or len(query) > 50:
+            return to_json_data(data={'suggestions': []})
+
+        # 热门前缀缓存在redis中，索引更新时失效
+        cache_key = 'news_suggest:{}'.format(hashlib.md5(query.encode('utf8')).hexdigest())
+        response = get_json_response_cached(request, cache_key, NEWS_SEARCH_VERSION_KEY, partial(get_suggestions, query),
+                                            NEWS_SUGGEST_CACHE_EXPIRES, stat_name='suggest')
+        # 输入时浏览器重复请求相同前缀直接使用本地缓存
+        response['Cache-Control'] = 'public, max-age={}'.format(NEWS_SUGGEST_MAX_AGE)
+        return response
+
+
+def get_suggest_queryset(query):
+    # autocomplete会按空格拆分后分别匹配，联想字段是整个标题的前缀，整体作为一个短语匹配
+    return SearchQuerySet().models(models.News).filter(title_auto=Exact(query))
+
+
+def get_suggestions(query):
+    results = get_suggest_queryset(query)[:NEWS_SUGGEST_COUNT]
+    return {
+        'suggestions': [{'id': int(result.pk), 'title': result.title} for result in results],
+    }
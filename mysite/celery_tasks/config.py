@@ -1 +1,22 @@
-broker_url = "redis://192.168.2.80/15"
\ No newline at end of file
+from django.conf import settings
+
+broker_url = "redis://192.168.2.80/15"
+
+# celery beat定时任务
+beat_schedule = {
+    # 新闻点击量批量写库
+    'flush-news-clicks': {
+        'task': 'flush_news_clicks',
+        'schedule': settings.NEWS_CLICKS_FLUSH_INTERVAL,
+    },
+    # 处理提交任务失败或任务异常时遗留在队列中的新闻
+    'update-news-index': {
+        'task': 'update_news_index',
+        'schedule': settings.NEWS_INDEX_FLUSH_INTERVAL,
+    },
+    # 删除任务异常、worker重启时遗留在暂存目录中的上传文件
+    'sweep-upload-spool': {
+        'task': 'sweep_upload_spool',
+        'schedule': settings.UPLOAD_SPOOL_SWEEP_INTERVAL,
+    },
+}
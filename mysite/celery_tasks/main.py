@@ -5,6 +5,13 @@ import os
 if not os.getenv('DJANGO_SETTINGS_MODULE'):
     os.environ['DJANGO_SETTINGS_MODULE'] = 'dj_web.settings'
 
+# worker中的任务需要使用django ORM，单独启动worker时先初始化django
+# web进程导入时django已经初始化（或正在初始化），不能重复执行
+import django
+from django.apps import apps
+if not apps.ready and not apps.loading:
+    django.setup()
+
 # 创建celery应用/实例
 app = Celery('codes')
 
@@ -12,4 +19,4 @@ app = Celery('codes')
 app.config_from_object('celery_tasks.config')
 
 # 自动注册celery任务
-app.autodiscover_tasks(['celery_tasks.sms'])
\ No newline at end of file
+app.autodiscover_tasks(['celery_tasks.sms', 'celery_tasks.news', 'celery_tasks.upload'])
\ No newline at end of file
@@ -0,0 +1,36 @@
+import logging
+
+from celery_tasks.main import app
+
+logger = logging.getLogger("django")
+
+
+@app.task(name='flush_news_clicks')
+def flush_news_clicks():
+    # 在任务中导入，保证worker已经初始化django
+    from news.clicks import flush_news_clicks as _flush_news_clicks
+    try:
+        _flush_news_clicks()
+    except Exception as e:
+        # 增量保留在redis中，下次任务重试
+        logger.error("点击量写库[异常][ message: %s ]" % e)
+
+
+@app.task(name='update_news_index')
+def update_news_index():
+    from news.search_queue import process_news_index_queue
+    try:
+        process_news_index_queue()
+    except Exception as e:
+        # 新闻id已放回队列，由定时任务重试
+        logger.error("搜索索引更新[异常][ message: %s ]" % e)
+
+
+@app.task(name='make_news_image_variants')
+def make_news_image_variants(image_url):
+    from news.images import make_image_variants
+    try:
+        make_image_variants(image_url)
+    except Exception as e:
+        # 没有缩略图时列表中显示原图
+        logger.error("生成缩略图[异常][ image_url: %s message: %s ]" % (image_url, e))
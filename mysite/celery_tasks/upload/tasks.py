@@ -0,0 +1,26 @@
+import logging
+
+from celery_tasks.main import app
+
+logger = logging.getLogger("django")
+
+
+@app.task(name='upload_spooled_file')
+def upload_spooled_file(job_id):
+    # 在任务中导入，保证worker已经初始化django
+    from admin.uploads import process_upload_job
+    try:
+        process_upload_job(job_id)
+    except Exception as e:
+        logger.error("异步上传文件[异常][ job_id: %s message: %s ]" % (job_id, e))
+
+
+@app.task(name='sweep_upload_spool')
+def sweep_upload_spool():
+    from admin.uploads import sweep_spool_files
+    try:
+        count = sweep_spool_files()
+        if count:
+            logger.info("清理上传暂存文件：%s" % count)
+    except Exception as e:
+        logger.error("清理上传暂存文件[异常][ message: %s ]" % e)
@@ -136,6 +136,9 @@ SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 # 指定缓存redis的别名
 SESSION_CACHE_ALIAS = "session"
 
+# 运行测试时redis使用fakeredis
+TEST_RUNNER = 'utils.test_runner.FakeRedisTestRunner'
+
 
 # 配置日志器，记录网站的日志信息
 LOGGING = {
@@ -236,7 +239,8 @@ ELASTICSEARCH_DSL = {
 # Haystack
 HAYSTACK_CONNECTIONS = {
     'default': {
-        'ENGINE': 'haystack.backends.elasticsearch_backend.ElasticsearchSearchEngine',
+        # 正文不保存在_source中的elasticsearch后端
+        'ENGINE': 'news.search_backends.NewsElasticsearchSearchEngine',
         'URL': 'http://192.168.2.242:8002/',  # 此处为elasticsearch运行的服务器ip地址，端口号默认为9200
         'INDEX_NAME': 'dj_web',  # 指定elasticsearch建立的索引库的名称
     },
@@ -245,8 +249,8 @@ HAYSTACK_CONNECTIONS = {
 # 设置每页显示的数据量
 HAYSTACK_SEARCH_RESULTS_PER_PAGE = 5
 
-# 当数据库改变时，会自动更新索引
-HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+# 当数据库改变时，把新闻id放入redis队列，由celery任务批量更新索引
+HAYSTACK_SIGNAL_PROCESSOR = 'news.signal_processors.QueuedSignalProcessor'
 
 # 站点域名和端口配置
 SITE_DOMAIN_PORT = "http://192.168.2.242:8000"
@@ -254,5 +258,31 @@ SITE_DOMAIN_PORT = "http://192.168.2.242:8000"
 # fastdfs服务站点
 FASTDFS_SERVER_DOMAIN = "http://192.168.2.242:8888"
 
+# 文档下载交给nginx：返回X-Accel-Redirect，由nginx内部location请求fastdfs
+# 需要nginx配置deploy/nginx_dj_pro.conf中的 location /fdfs_internal/，使用runserver时保持False
+DOC_DOWNLOAD_ACCEL_REDIRECT = False
+DOC_DOWNLOAD_ACCEL_PREFIX = '/fdfs_internal'
+
+# 上传文件超过该大小时django保存到临时文件中，再由utils.fastdfs.fdfs.upload_file分块上传到fastdfs
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+# 接收上传文件时计算SHA-256，相同的文件只上传一次
+FILE_UPLOAD_HANDLERS = [
+    'utils.fastdfs.upload_handlers.Sha256MemoryFileUploadHandler',
+    'utils.fastdfs.upload_handlers.Sha256TemporaryFileUploadHandler',
+]
+# 异步上传的文件暂存目录，由celery任务上传到fastdfs后删除，web进程和celery worker需要能访问同一个目录
+UPLOAD_SPOOL_DIR = os.path.join(BASE_DIR, 'spool')
+# 清理暂存目录中遗留文件的间隔，单位秒
+UPLOAD_SPOOL_SWEEP_INTERVAL = 60 * 60
+
 # 登录的url地址
-LOGIN_URL = 'user:login'
\ No newline at end of file
+LOGIN_URL = 'user:login'
+
+# 新闻点击量先累加在redis中，由celery定时任务批量写入数据库
+# 写库间隔，单位秒
+NEWS_CLICKS_FLUSH_INTERVAL = 60
+# 缓冲的点击数达到该值时立即触发一次写库，用来限制redis故障时可能丢失的点击数，为0时只按间隔写库
+NEWS_CLICKS_MAX_PENDING = 1000
+
+# 搜索索引队列兜底处理间隔，单位秒
+NEWS_INDEX_FLUSH_INTERVAL = 60
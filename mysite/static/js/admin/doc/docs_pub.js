@@ -41,6 +41,8 @@ $(function () {
     let file = this.files[0];   // 获取文件
     let oFormData = new FormData();  // 创建一个 FormData
     oFormData.append("text_file", file); // 把文件添加进去
+    // 异步上传，服务器保存文件后返回任务id，再查询上传到fastdfs的进度
+    oFormData.append("async", "1");
     // 发送请求
     $.ajax({
       url: "/admin/docs/files/",
@@ -51,11 +53,7 @@ $(function () {
     })
       .done(function (res) {
         if (res.errno === "0") {
-          message.showSuccess("文件上传成功");
-          let sTextFileUrl = res.data.text_file;
-          $docFileUrl.val('');
-          $docFileUrl.val(sTextFileUrl);
-
+          fn_poll_upload_job(res.data.job_id);
         } else {
           message.showError(res.errmsg)
         }
@@ -66,6 +64,41 @@ $(function () {
 
   });
 
+  // 查询异步上传的进度，完成后填入文档地址
+  function fn_poll_upload_job(sJobId) {
+    $.ajax({
+      url: "/admin/uploads/" + sJobId + "/",
+      type: "GET",
+      dataType: "json",
+    })
+      .done(function (res) {
+        if (res.errno !== "0") {
+          message.showError(res.errmsg);
+          return
+        }
+        let oJob = res.data;
+        if (oJob.status === "done") {
+          $progressBar.parent().css("display", 'none');
+          message.showSuccess("文件上传成功");
+          $docFileUrl.val('');
+          $docFileUrl.val(oJob.url);
+        } else if (oJob.status === "failed") {
+          $progressBar.parent().css("display", 'none');
+          message.showError(oJob.errmsg);
+        } else {
+          $progressBar.parent().css("display", 'block');
+          $progressBar.css("width", oJob.progress + '%');
+          $progressBar.text(oJob.progress + '%');
+          setTimeout(function () {
+            fn_poll_upload_job(sJobId)
+          }, 1000);
+        }
+      })
+      .fail(function () {
+        message.showError('服务器超时，请重试！');
+      });
+  }
+
 
   // ================== 上传图片至七牛（云存储平台） ================
   let $progressBar = $(".progress-bar");
@@ -104,6 +104,44 @@ $(function () {
   });
 
 
+  // 开启或关闭标签下文章的搜索
+  let $tagSearchable = $(".btn-searchable");
+  $tagSearchable.click(function () {
+    let sTagId = $(this).parents('tr').data('id');
+    let sTagName = $(this).parents('tr').data('name');
+    let bSearchable = $(this).parents('tr').data('searchable') !== 1;
+    fAlert.alertConfirm({
+      title: "确定" + (bSearchable ? "开启" : "关闭") + " " + sTagName + " 标签的搜索吗？",
+      type: "warning",
+      confirmText: "确认",
+      cancelText: "取消",
+      confirmCallback: function confirmCallback() {
+
+        $.ajax({
+          url: "/admin/tags/" + sTagId + "/",
+          type: "PUT",
+          data: JSON.stringify({"is_searchable": bSearchable}),
+          contentType: "application/json; charset=utf-8",
+          dataType: "json",
+        })
+          .done(function (res) {
+            if (res.errno === "0") {
+              message.showSuccess("修改成功，搜索索引稍后更新");
+              setTimeout(function () {
+                window.location.reload();
+              }, 1000)
+            } else {
+              message.showError(res.errmsg);
+            }
+          })
+          .fail(function () {
+            message.showError('服务器超时，请重试！');
+          });
+      }
+    });
+  });
+
+
   // 删除标签
   let $tagDel = $(".btn-del");  // 1. 获取删除按钮
   $tagDel.click(function () {   // 2. 点击触发事件
@@ -1,13 +1,13 @@
 $(function () {
   // 新闻列表功能
   let $newsLi = $(".news-nav ul li");
-  let iPage = 1;  //默认第1页
-  let iTotalPage = 1; //默认总页数为1
+  let sNextCursor = "";  //下一页游标，空字符串表示第1页
+  let bHasMore = true; //是否还有更多数据
   let sCurrentTagId = 0; //默认分类标签为0
   let bIsLoadData = true;   // 是否正在向后台加载数据
 
-  // 加载新闻列表信息
-  fn_load_content();
+  // 首页数据合并在一个接口中：轮播图和第一页新闻列表
+  fn_load_bundle();
 
   $newsLi.click(function () {
     // 点击分类标签，则为点击的标签加上一个class属性为active
@@ -19,8 +19,8 @@ $(function () {
     if (sClickTagId !== sCurrentTagId) {
             sCurrentTagId = sClickTagId;  // 记录当前分类id
             // 重置分页参数
-            iPage = 1;
-            iTotalPage = 1;
+            sNextCursor = "";
+            bHasMore = true;
             fn_load_content()
         }
   });
@@ -43,9 +43,8 @@ $(function () {
       // 判断页数，去更新新闻数据
       if (!bIsLoadData) {
         bIsLoadData = true;
-        // 如果当前页数据如果小于总页数，那么才去加载数据
-        if (iPage < iTotalPage) {
-          iPage += 1;
+        // 如果还有下一页，那么才去加载数据
+        if (bHasMore) {
           $(".btn-more").remove();  // 删除标签
           // 去加载数据
           fn_load_content()
@@ -59,8 +58,7 @@ $(function () {
     }
   });
 
-  // 新闻轮播图功能
-  fn_load_banner();
+  // 新闻轮播图功能，轮播图已在fn_load_bundle中加载
   /*=== bannerStart ===*/
   let $banner = $('.banner');
   let $picLi = $(".banner .pic li");
@@ -115,10 +113,10 @@ $(function () {
   function fn_load_content() {
     // let sCurrentTagId = $('.active a').attr('data-id');
 
-    // 创建请求参数
+    // 创建请求参数，使用游标分页
     let sDataParams = {
       "tag_id": sCurrentTagId,
-      "page": iPage
+      "cursor": sNextCursor
     };
 
     // 创建ajax请求
@@ -133,34 +131,7 @@ $(function () {
     })
       .done(function (res) {
         if (res.errno === "0") {
-          iTotalPage = res.data.total_pages;  // 后端传过来的总页数
-          if (iPage === 1) {
-            $(".news-list").html("")
-          }
-
-          res.data.news.forEach(function (one_news) {
-            let content = `
-              <li class="news-item">
-                 <a href="/news/${one_news.id}" class="news-thumbnail" target="_blank">
-                    <img src="${one_news.image_url}" alt="${one_news.title}" title="${one_news.title}">
-                 </a>
-                 <div class="news-content">
-                    <h4 class="news-title"><a href="/news/${one_news.id}">${one_news.title}</a></h4>
-                    <p class="news-details">${one_news.digest}</p>
-                    <div class="news-other">
-                      <span class="news-type">${one_news.tag_name}</span>
-                      <span class="news-time">${one_news.update_time}</span>
-                      <span class="news-author">${one_news.author}</span>
-                    </div>
-                 </div>
-              </li>`;
-            $(".news-list").append(content)
-          });
-
-          $(".news-list").append($('<a href="javascript:void(0);" class="btn-more">滚动加载更多</a>'));
-          // 数据加载完毕，设置正在加载数据的变量为false，表示当前没有在加载数据
-          bIsLoadData = false;
-
+          fn_render_news(res.data);
         } else {
           // 登录失败，打印错误信息
           message.showError(res.errmsg);
@@ -171,28 +142,73 @@ $(function () {
       });
   }
 
-  function fn_load_banner() {
+  // 图片有webp缩略图时由浏览器选择webp或jpeg
+  function fn_picture(sImageUrl, sWebpUrl, sAlt) {
+    let sImg = `<img src="${sImageUrl}" alt="${sAlt}" title="${sAlt}">`;
+    if (!sWebpUrl) {
+      return sImg
+    }
+    return `<picture><source srcset="${sWebpUrl}" type="image/webp">${sImg}</picture>`
+  }
+
+  // 显示一页新闻列表
+  function fn_render_news(data) {
+    if (sNextCursor === "") {
+      $(".news-list").html("")
+    }
+    // 后端传过来的下一页游标，为null时没有更多数据
+    sNextCursor = data.next_cursor;
+    bHasMore = sNextCursor !== null;
+
+    data.news.forEach(function (one_news) {
+      let content = `
+        <li class="news-item">
+           <a href="/news/${one_news.id}" class="news-thumbnail" target="_blank">
+              ${fn_picture(one_news.image_url, one_news.image_webp_url, one_news.title)}
+           </a>
+           <div class="news-content">
+              <h4 class="news-title"><a href="/news/${one_news.id}">${one_news.title}</a></h4>
+              <p class="news-details">${one_news.digest}</p>
+              <div class="news-other">
+                <span class="news-type">${one_news.tag_name}</span>
+                <span class="news-time">${one_news.update_time}</span>
+                <span class="news-author">${one_news.author}</span>
+              </div>
+           </div>
+        </li>`;
+      $(".news-list").append(content)
+    });
+
+    $(".news-list").append($('<a href="javascript:void(0);" class="btn-more">滚动加载更多</a>'));
+    // 数据加载完毕，设置正在加载数据的变量为false，表示当前没有在加载数据
+    bIsLoadData = false;
+  }
+
+  function fn_load_bundle() {
     $.ajax({
       // 请求地址
-      url: "/news/banners/",  // url尾部需要添加/
+      url: "/news/bundle/",  // url尾部需要添加/
       // 请求方式
       type: "GET",
+      // 轮播图功能需要在数据加载后初始化
       async: false
     })
       .done(function (res) {
         if (res.errno === "0") {
+          fn_render_news(res.data.news_list);
+
           let content = ``;
           let tab_content = ``;
           res.data.banners.forEach(function (one_banner, index) {
             if (index === 0){
               content = `
                 <li style="display:block;"><a href="/news/${one_banner.news_id}">
-                 <img src="${one_banner.image_url}" alt="${one_banner.news_title}"></a></li>
+                 ${fn_picture(one_banner.image_url, one_banner.image_webp_url, one_banner.news_title)}</a></li>
               `;
               tab_content = `<li class="active"></li>`;
             } else {
               content = `
-              <li><a href="/news/${one_banner.news_id}"><img src="${one_banner.image_url}" alt="${one_banner.news_title}"></a></li>
+              <li><a href="/news/${one_banner.news_id}">${fn_picture(one_banner.image_url, one_banner.image_webp_url, one_banner.news_title)}</a></li>
               `;
               tab_content = `<li></li>`;
             }
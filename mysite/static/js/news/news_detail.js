@@ -46,21 +46,21 @@ $(function () {
           <li class="comment-item">
             <div class="comment-info clearfix">
               <img src="/static/images/avatar.jpeg" alt="avatar" class="comment-avatar">
-              <span class="comment-user">${one_comment.author}</span>
+              <span class="comment-user">${fn_escape_html(one_comment.author)}</span>
             </div>
-            <div class="comment-content">${one_comment.content}</div>
+            <div class="comment-content">${fn_escape_html(one_comment.content)}</div>
 
                 <div class="parent_comment_text">
-                  <div class="parent_username">${one_comment.parent.author}</div>
+                  <div class="parent_username">${fn_escape_html(one_comment.parent.author)}</div>
                   <br/>
                   <div class="parent_content_text">
-                    ${one_comment.parent.content}
+                    ${fn_escape_html(one_comment.parent.content)}
                   </div>
                 </div>
 
-              <div class="comment_time left_float">${one_comment.update_time}</div>
+              <div class="comment_time left_float">${fn_escape_html(one_comment.update_time)}</div>
               <a href="javascript:;" class="reply_a_tag right_float">回复</a>
-              <form class="reply_form left_float" comment-id="${one_comment.content_id}" news-id="${one_comment.news_id}">
+              <form class="reply_form left_float" comment-id="${fn_escape_html(one_comment.comment_id)}" news-id="${fn_escape_html(one_comment.news_id)}">
                 <textarea class="reply_input"></textarea>
                 <input type="button" value="回复" class="reply_btn right_float">
                 <input type="reset" name="" value="取消" class="reply_cancel right_float">
@@ -151,13 +151,13 @@ $(function () {
           <li class="comment-item">
             <div class="comment-info clearfix">
               <img src="/static/images/avatar.jpeg" alt="avatar" class="comment-avatar">
-              <span class="comment-user">${one_comment.author}</span>
+              <span class="comment-user">${fn_escape_html(one_comment.author)}</span>
             </div>
-            <div class="comment-content">${one_comment.content}</div>
+            <div class="comment-content">${fn_escape_html(one_comment.content)}</div>
 
-              <div class="comment_time left_float">${one_comment.update_time}</div>
+              <div class="comment_time left_float">${fn_escape_html(one_comment.update_time)}</div>
               <a href="javascript:;" class="reply_a_tag right_float">回复</a>
-              <form class="reply_form left_float" comment-id="${one_comment.content_id}" news-id="${one_comment.news_id}">
+              <form class="reply_form left_float" comment-id="${fn_escape_html(one_comment.comment_id)}" news-id="${fn_escape_html(one_comment.news_id)}">
                 <textarea class="reply_input"></textarea>
                 <input type="button" value="回复" class="reply_btn right_float">
                 <input type="reset" name="" value="取消" class="reply_cancel right_float">
@@ -187,6 +187,86 @@ $(function () {
       });
   });
 
+  // 加载更多评论
+  $('.comment-more').click(function () {
+    let $this = $(this);
+    let news_id = $this.attr('news-id');
+    $.ajax({
+      url: "/news/" + news_id + "/comments/",
+      type: "GET",
+      data: {"cursor": $this.attr('data-cursor')},
+      dataType: "json",
+    })
+      .done(function (res) {
+        if (res.errno === "0") {
+          res.data.comments.forEach(function (one_comment) {
+            $(".comment-list").append(fn_render_comment(one_comment))
+          });
+          // 没有更多评论时移除按钮
+          if (res.data.next_cursor === null) {
+            $this.parent().remove();
+          } else {
+            $this.attr('data-cursor', res.data.next_cursor);
+          }
+        } else {
+          message.showError(res.errmsg);
+        }
+      })
+      .fail(function () {
+        message.showError('服务器超时，请重试！');
+      });
+  });
+
+  // 转义服务器返回的文字，评论内容和用户名由用户填写，不能直接拼接到html中
+  function fn_escape_html(value) {
+    return $('<div>').text(value === null || value === undefined ? '' : String(value)).html()
+      .replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+  }
+
+  // 评论html，回复递归显示在comment-children中
+  function fn_render_comment(one_comment) {
+    let parent_html = ``;
+    if (one_comment.parent) {
+      parent_html = `
+        <div class="parent_comment_text">
+          <div class="parent_username">${fn_escape_html(one_comment.parent.author)}</div>
+          <br/>
+          <div class="parent_content_text">
+            ${fn_escape_html(one_comment.parent.content)}
+          </div>
+        </div>`;
+    }
+    let children_html = ``;
+    if (one_comment.children.length) {
+      children_html = `<ul class="comment-children">${one_comment.children.map(fn_render_comment).join('')}</ul>`;
+    }
+    // 已删除的评论只显示占位文字和它下面的回复
+    if (one_comment.deleted) {
+      return `
+      <li class="comment-item">
+        <div class="comment-content">${fn_escape_html(one_comment.content)}</div>
+        ${children_html}
+      </li>`;
+    }
+    return `
+      <li class="comment-item">
+        <div class="comment-info clearfix">
+          <img src="/static/images/avatar.jpeg" alt="avatar" class="comment-avatar">
+          <span class="comment-user">${fn_escape_html(one_comment.author)}</span>
+        </div>
+        <div class="comment-content">${fn_escape_html(one_comment.content)}</div>
+        ${parent_html}
+        <div class="comment_time left_float">${fn_escape_html(one_comment.update_time)}</div>
+        <a href="javascript:;" class="reply_a_tag right_float">回复</a>
+        <form class="reply_form left_float" comment-id="${fn_escape_html(one_comment.comment_id)}" news-id="${fn_escape_html(one_comment.news_id)}">
+          <textarea class="reply_input"></textarea>
+          <input type="button" value="回复" class="reply_btn right_float">
+          <input type="reset" name="" value="取消" class="reply_cancel right_float">
+        </form>
+        ${children_html}
+      </li>`;
+  }
+
   // get cookie using jQuery
   function getCookie(name) {
     let cookieValue = null;
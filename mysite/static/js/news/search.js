@@ -0,0 +1,32 @@
+$(function () {
+  // 搜索联想
+  let $searchInput = $(".search-control");
+  let $suggestList = $("#search-suggest");
+  let iTimer = null;  // 输入停止一段时间后再请求
+  let sLastQuery = "";
+
+  $searchInput.on("input", function () {
+    let sQuery = $.trim($(this).val());
+    clearTimeout(iTimer);
+    if (!sQuery || sQuery === sLastQuery) {
+      return;
+    }
+    iTimer = setTimeout(function () {
+      sLastQuery = sQuery;
+      $.ajax({
+        url: "/search/suggest/",
+        type: "GET",
+        data: {"q": sQuery},
+        dataType: "json",
+      })
+        .done(function (res) {
+          if (res.errno === "0") {
+            $suggestList.empty();
+            res.data.suggestions.forEach(function (one_suggestion) {
+              $suggestList.append($("<option>").attr("value", one_suggestion.title));
+            });
+          }
+        });
+    }, 250);
+  });
+});
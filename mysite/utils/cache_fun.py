@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import time
+
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from django_redis import get_redis_connection
+
+from utils.json_fun import to_json_bytes
+
+logger = logging.getLogger('django')
+
+# 缓存命中统计存放的hash键，字段格式：<统计名>:hit / <统计名>:miss
+CACHE_STATS_KEY = 'cache_stats'
+
+
+def _init_version():
+    # 用毫秒时间戳初始化版本号，版本号键被清掉后也不会和旧缓存数据的版本号重复
+    return int(time.time() * 1000)
+
+
+def get_cache_version(version_key, alias='default'):
+    """
+    获取缓存版本号，不存在则初始化
+    """
+    cache = caches[alias]
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, _init_version(), timeout=None)
+        version = cache.get(version_key)
+    return version
+
+
+def bump_cache_version(version_key, alias='default'):
+    """
+    版本号加一，旧版本的缓存数据不再被读取，等待过期即可
+    """
+    cache = caches[alias]
+    try:
+        return cache.incr(version_key)
+    except ValueError:
+        # 版本号键不存在
+        cache.add(version_key, _init_version(), timeout=None)
+        return cache.get(version_key)
+
+
+def record_cache_stat(stat_name, hit, alias='default'):
+    """
+    记录缓存命中/未命中次数
+    """
+    field = '{}:{}'.format(stat_name, 'hit' if hit else 'miss')
+    try:
+        get_redis_connection(alias).hincrby(CACHE_STATS_KEY, field, 1)
+    except Exception as e:
+        logger.error('缓存统计写入异常：\n{}'.format(e))
+
+
+def get_cache_stats(alias='default'):
+    """
+    :return: {统计名: {'hit': 命中次数, 'miss': 未命中次数, 'hit_rate': 命中率}}
+    """
+    stats = {}
+    raw_stats = get_redis_connection(alias).hgetall(CACHE_STATS_KEY)
+    for field, count in raw_stats.items():
+        stat_name, kind = field.decode('utf8').rsplit(':', 1)
+        stats.setdefault(stat_name, {'hit': 0, 'miss': 0})[kind] = int(count)
+    for item in stats.values():
+        total = item['hit'] + item['miss']
+        item['hit_rate'] = round(item['hit'] / total, 4) if total else 0
+    return stats
+
+
+def get_or_set_versioned(cache_key, version_key, builder, timeout, stat_name=None, alias='default'):
+    """
+    按版本号读取缓存，未命中时调用builder重建并写入缓存
+    :param cache_key: 缓存键
+    :param version_key: 版本号键，数据变化时通过bump_cache_version使缓存失效
+    :param builder: 无参函数，返回需要缓存的数据（不能为None）
+    :param timeout: 缓存有效期，单位秒
+    :param stat_name: 命中统计名，默认同cache_key
+    :param alias: CACHES中的缓存别名
+    """
+    cache = caches[alias]
+    stat_name = stat_name or cache_key
+    try:
+        version = get_cache_version(version_key, alias)
+        data = cache.get(cache_key, version=version)
+    except Exception as e:
+        # redis不可用时直接查数据库
+        logger.error('读取缓存{}异常：\n{}'.format(cache_key, e))
+        return builder()
+
+    if data is not None:
+        record_cache_stat(stat_name, True, alias)
+        return data
+
+    record_cache_stat(stat_name, False, alias)
+    data = builder()
+    try:
+        cache.set(cache_key, data, timeout, version=version)
+    except Exception as e:
+        logger.error('写入缓存{}异常：\n{}'.format(cache_key, e))
+    return data
+
+
+def _encode_json_entry(builder):
+    # 缓存编码好的响应体和对应的ETag，命中时不需要再序列化
+    body = to_json_bytes(data=builder())
+    return {
+        'body': body,
+        'etag': '"{}"'.format(hashlib.md5(body).hexdigest()),
+    }
+
+
+def get_json_response_cached(request, cache_key, version_key, builder, timeout, stat_name=None, alias='default'):
+    """
+    缓存整个json响应体，支持If-None-Match返回304
+    :param builder: 无参函数，返回to_json_data中data部分的数据
+    其它参数同get_or_set_versioned
+    """
+    entry = get_or_set_versioned(cache_key, version_key, lambda: _encode_json_entry(builder), timeout,
+                                 stat_name=stat_name, alias=alias)
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        # 忽略弱校验前缀W/
+        if '*' in etags or entry['etag'] in [etag.replace('W/', '', 1) for etag in etags]:
+            response = HttpResponseNotModified()
+            response['ETag'] = entry['etag']
+            return response
+    response = HttpResponse(entry['body'], content_type='application/json')
+    response['ETag'] = entry['etag']
+    return response
@@ -1,2 +1,181 @@
-from fdfs_client.client import Fdfs_client
-FDFS_Client = Fdfs_client('utils/fastdfs/client.conf')
\ No newline at end of file
+import hashlib
+import logging
+import os
+import threading
+
+from django_redis import get_redis_connection
+
+from utils.cache_fun import record_cache_stat
+from .pool import FdfsClient
+
+logger = logging.getLogger('django')
+
+FDFS_CLIENT_CONF = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client.conf')
+# 每个进程中tracker、每个storage的最大连接数，等于uwsgi的线程数即可
+FDFS_POOL_MAX_CONN = 10
+# 连接都在使用时等待的秒数
+FDFS_POOL_WAIT_TIMEOUT = 5
+# 连接异常时的重试次数
+FDFS_RETRY_TIMES = 1
+
+_fdfs_client = None
+_fdfs_client_lock = threading.Lock()
+
+
+def get_fdfs_client():
+    """
+    第一次使用时创建客户端，导入时不读取配置、不建立连接
+    """
+    global _fdfs_client
+    if _fdfs_client is None:
+        with _fdfs_client_lock:
+            if _fdfs_client is None:
+                _fdfs_client = FdfsClient(FDFS_CLIENT_CONF, max_conn=FDFS_POOL_MAX_CONN,
+                                          wait_timeout=FDFS_POOL_WAIT_TIMEOUT, retry_times=FDFS_RETRY_TIMES)
+    return _fdfs_client
+
+# 分块上传时每次发送给fastdfs的字节数，单个上传占用的内存不超过该值
+FDFS_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 已上传文件登记表（redis hash），字段：<sha256>.<拓展名>，值：Remote file_id
+FDFS_UPLOAD_REGISTRY_KEY = 'fdfs_upload_registry'
+# 登记表的反向索引（redis hash），字段：Remote file_id，值：登记表中的字段，删除文件时使用
+FDFS_UPLOAD_REGISTRY_FILES_KEY = 'fdfs_upload_registry_files'
+
+# 登记的还是这个文件时才删除，不删除同时重新上传后登记的新文件
+UNREGISTER_FILE_SCRIPT = """
+if redis.call('hget', KEYS[1], ARGV[1]) == ARGV[2] then
+    redis.call('hdel', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+
+def get_file_sha256(file):
+    """
+    :return: 上传文件的SHA-256，上传处理器已经计算过时直接使用
+    """
+    sha256 = getattr(file, 'sha256', None)
+    if sha256:
+        return sha256
+    h = hashlib.sha256()
+    for chunk in file.chunks(FDFS_UPLOAD_CHUNK_SIZE):
+        h.update(chunk)
+    file.seek(0)
+    return h.hexdigest()
+
+
+def _registry_field(sha256, file_ext_name):
+    # 拓展名不同时文件地址不同，分开登记
+    return '{}.{}'.format(sha256, (file_ext_name or '').lower())
+
+
+def _unregister_file(con_redis, field, file_id):
+    con_redis.eval(UNREGISTER_FILE_SCRIPT, 1, FDFS_UPLOAD_REGISTRY_KEY, field, file_id)
+    con_redis.hdel(FDFS_UPLOAD_REGISTRY_FILES_KEY, file_id)
+
+
+def delete_file(file_id):
+    """
+    从fastdfs删除文件，同时删除上传登记，之后上传相同的文件会重新上传
+    :param file_id: Remote file_id
+    """
+    delete_res = get_fdfs_client().delete_file(file_id.encode())
+    try:
+        con_redis = get_redis_connection('default')
+        field = con_redis.hget(FDFS_UPLOAD_REGISTRY_FILES_KEY, file_id)
+        if field is not None:
+            _unregister_file(con_redis, field.decode(), file_id)
+    except Exception as e:
+        # 登记没有删除时，再次上传相同文件会检查到文件不存在而重新上传
+        logger.error('上传文件登记删除异常：\n{}'.format(e))
+    return delete_res
+
+
+def upload_file_chunked(file, file_ext_name=None, chunk_size=FDFS_UPLOAD_CHUNK_SIZE, progress=None):
+    """
+    不查询登记表，直接分块上传
+    :param progress: 每上传一块调用一次，参数为已上传的字节数
+    """
+    client = get_fdfs_client()
+    if file.size <= chunk_size:
+        upload_res = client.upload_by_buffer(file.read(), file_ext_name=file_ext_name)
+        if progress:
+            progress(file.size)
+        return upload_res
+
+    upload_res = None
+    uploaded = 0
+    try:
+        for chunk in file.chunks(chunk_size):
+            if upload_res is None:
+                # 第一块创建appender文件，其余的块追加到该文件
+                upload_res = client.upload_appender_by_buffer(chunk, file_ext_name=file_ext_name)
+                if upload_res.get('Status') != 'Upload successed.':
+                    return upload_res
+            else:
+                client.append_by_buffer(chunk, upload_res['Remote file_id'].encode())
+            uploaded += len(chunk)
+            if progress:
+                progress(uploaded)
+    except Exception:
+        if upload_res and upload_res.get('Status') == 'Upload successed.':
+            # 删除只上传了一部分的文件
+            try:
+                client.delete_file(upload_res['Remote file_id'].encode())
+            except Exception as e:
+                logger.error('删除未上传完成的文件异常：{}'.format(e))
+        raise
+    upload_res['Uploaded size'] = file.size
+    return upload_res
+
+
+def upload_file(file, file_ext_name=None, chunk_size=FDFS_UPLOAD_CHUNK_SIZE, progress=None):
+    """
+    上传django的上传文件，大文件分块追加，不把整个文件读入内存；
+    已经上传过且仍然存在的相同文件直接返回原来的Remote file_id
+    :param file: UploadedFile，超过FILE_UPLOAD_MAX_MEMORY_SIZE的文件已保存在临时文件中
+    :param file_ext_name: 文件拓展名
+    :param progress: 上传进度回调，参数为已上传的字节数
+    :return: 和upload_by_buffer相同的结果，重复文件的结果中Duplicate为True
+    """
+    field = _registry_field(get_file_sha256(file), file_ext_name)
+    con_redis = None
+    try:
+        con_redis = get_redis_connection('default')
+        file_id = con_redis.hget(FDFS_UPLOAD_REGISTRY_KEY, field)
+    except Exception as e:
+        # 登记表不可用时正常上传
+        logger.error('上传文件登记表读取异常：\n{}'.format(e))
+        file_id = None
+    if file_id is not None:
+        file_id = file_id.decode()
+        # 文件可能已经被删除（例如删除时登记表不可用），不存在时删除登记重新上传
+        if not get_fdfs_client().file_exists(file_id.encode()):
+            logger.warning('登记的上传文件{}已不存在，重新上传'.format(file_id))
+            try:
+                _unregister_file(con_redis, field, file_id)
+            except Exception as e:
+                logger.error('上传文件登记删除异常：\n{}'.format(e))
+            file_id = None
+    record_cache_stat('fdfs_upload_dedup', file_id is not None)
+    if file_id is not None:
+        if progress:
+            progress(file.size)
+        return {'Status': 'Upload successed.', 'Remote file_id': file_id, 'Duplicate': True}
+
+    upload_res = upload_file_chunked(file, file_ext_name, chunk_size, progress)
+    if con_redis is None or upload_res.get('Status') != 'Upload successed.':
+        return upload_res
+    try:
+        if con_redis.hsetnx(FDFS_UPLOAD_REGISTRY_KEY, field, upload_res['Remote file_id']):
+            con_redis.hset(FDFS_UPLOAD_REGISTRY_FILES_KEY, upload_res['Remote file_id'], field)
+        else:
+            # 同时上传了相同的文件，使用先登记的文件，删除刚上传的
+            file_id = con_redis.hget(FDFS_UPLOAD_REGISTRY_KEY, field)
+            if file_id is not None and file_id.decode() != upload_res['Remote file_id']:
+                get_fdfs_client().delete_file(upload_res['Remote file_id'].encode())
+                return {'Status': 'Upload successed.', 'Remote file_id': file_id.decode(), 'Duplicate': True}
+    except Exception as e:
+        logger.error('上传文件登记异常：\n{}'.format(e))
+    return upload_res
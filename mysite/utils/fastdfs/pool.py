@@ -0,0 +1,389 @@
+'''
+fastdfs客户端连接池：fdfs_client的Fdfs_client每次请求都新建一个storage连接池，连接不复用，
+连接池不是线程安全的，连接失败重试10次后调用sys.exit，并且只使用connect_timeout一个超时。
+这里每个进程保存一个tracker连接池和每个storage的连接池，连接数有上限，线程安全，
+连接失败时换下一个tracker，请求失败时按次数重试，协议部分仍然使用fdfs_client
+'''
+import logging
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+from fdfs_client.connection import Connection
+from fdfs_client.exceptions import ConnectionError, ResponseError, DataError
+from fdfs_client.storage_client import Storage_client
+from fdfs_client.tracker_client import Tracker_client
+from fdfs_client.utils import split_remote_fileid
+
+logger = logging.getLogger('django')
+
+# 连接异常，出现时丢弃空闲连接并重试
+CONNECTION_ERRORS = (ConnectionError, ResponseError, socket.error, struct.error)
+
+
+def read_client_conf(conf_path):
+    """
+    读取fastdfs的client.conf，tracker_server可以配置多行
+    :return: {'trackers': [(ip, port)], 'connect_timeout': 秒, 'network_timeout': 秒, 'max_idle_time': 秒}
+    """
+    trackers = []
+    options = {}
+    with open(conf_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, value = [i.strip() for i in line.split('=', 1)]
+            if key == 'tracker_server':
+                host, port = value.split(':')
+                trackers.append((host, int(port)))
+            else:
+                options[key] = value
+    if not trackers:
+        raise DataError('[-] Error: tracker_server not found in {}.'.format(conf_path))
+    return {
+        'trackers': trackers,
+        'connect_timeout': int(options.get('connect_timeout', 30)),
+        'network_timeout': int(options.get('network_timeout', 30)),
+        'max_idle_time': int(options.get('connection_pool_max_idle_time', 3600)),
+    }
+
+
+class PooledConnection(Connection):
+    """
+    建立连接和读写分别使用connect_timeout、network_timeout
+    """
+    def __init__(self, host, port, connect_timeout, network_timeout):
+        super().__init__(host_tuple=(host,), port=port, timeout=connect_timeout)
+        self.network_timeout = network_timeout
+        self.last_used = time.time()
+
+    def _connect(self):
+        self.remote_addr = self.host_tuple[0]
+        sock = socket.create_connection((self.remote_addr, self.remote_port), self.timeout)
+        sock.settimeout(self.network_timeout)
+        return sock
+
+    def is_usable(self, max_idle_time):
+        if self._sock is None or time.time() - self.last_used > max_idle_time:
+            return False
+        # 空闲连接上不应该有可读数据，可读说明服务端已经关闭连接或者上次请求的响应没有读完
+        try:
+            readable, _, _ = select.select([self._sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+
+class FdfsConnectionPool(object):
+    """
+    线程安全、有连接数上限的连接池，接口和fdfs_client的ConnectionPool相同
+    """
+    def __init__(self, name, hosts, connect_timeout, network_timeout, max_conn, wait_timeout, max_idle_time):
+        self.pool_name = name
+        self.hosts = list(hosts)
+        self.connect_timeout = connect_timeout
+        self.network_timeout = network_timeout
+        self.max_conn = max_conn
+        self.wait_timeout = wait_timeout
+        self.max_idle_time = max_idle_time
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self._conns_available = []
+        # 使用中的连接：取出连接的线程id
+        self._conns_inuse = {}
+        self._conns_created = 0
+        # 当前使用的地址，连接失败时换下一个
+        self._host_index = 0
+        self._counters = {'connects': 0, 'connect_errors': 0, 'reuses': 0, 'waits': 0, 'wait_timeouts': 0,
+                          'discards': 0}
+
+    def _check_pid(self):
+        # fork出的子进程不能使用父进程的连接
+        if self.pid != os.getpid():
+            self._reset()
+
+    def _discard(self, conn):
+        self._conns_created -= 1
+        self._counters['discards'] += 1
+        try:
+            conn.disconnect()
+        except Exception:
+            pass
+
+    def _connect(self):
+        errors = []
+        for i in range(len(self.hosts)):
+            index = (self._host_index + i) % len(self.hosts)
+            host, port = self.hosts[index]
+            conn = PooledConnection(host, port, self.connect_timeout, self.network_timeout)
+            try:
+                conn.connect()
+            except ConnectionError as e:
+                errors.append(str(e))
+                with self._cond:
+                    self._counters['connect_errors'] += 1
+                logger.warning('fastdfs {}连接失败：{}:{} {}'.format(self.pool_name, host, port, e))
+                continue
+            with self._cond:
+                self._host_index = index
+                self._counters['connects'] += 1
+            return conn
+        raise ConnectionError('[-] Error: {} all hosts failed. {}'.format(self.pool_name, ' '.join(errors)))
+
+    def get_connection(self):
+        deadline = time.time() + self.wait_timeout
+        with self._cond:
+            self._check_pid()
+            while True:
+                while self._conns_available:
+                    conn = self._conns_available.pop()
+                    if conn.is_usable(self.max_idle_time):
+                        self._conns_inuse[conn] = threading.get_ident()
+                        self._counters['reuses'] += 1
+                        return conn
+                    self._discard(conn)
+                if self._conns_created < self.max_conn:
+                    self._conns_created += 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._counters['wait_timeouts'] += 1
+                    raise ConnectionError('[-] Error: {} has no free connection.'.format(self.pool_name))
+                self._counters['waits'] += 1
+                self._cond.wait(remaining)
+
+        # 在锁外建立连接，不阻塞其他线程归还连接
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._conns_created -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._conns_inuse[conn] = threading.get_ident()
+        return conn
+
+    def release(self, conn):
+        with self._cond:
+            if conn not in self._conns_inuse:
+                # fork之前取出的连接
+                conn.disconnect()
+                return
+            del self._conns_inuse[conn]
+            conn.last_used = time.time()
+            self._conns_available.append(conn)
+            self._cond.notify()
+
+    def remove(self, conn):
+        with self._cond:
+            if conn in self._conns_inuse:
+                del self._conns_inuse[conn]
+                self._discard(conn)
+                self._cond.notify()
+
+    def discard_idle(self):
+        """
+        请求异常后关闭空闲连接和当前线程没有归还的连接：
+        fdfs_client在异常时可能已经把用过的连接放回连接池，也可能没有归还（发送请求头失败时）
+        """
+        ident = threading.get_ident()
+        with self._cond:
+            while self._conns_available:
+                self._discard(self._conns_available.pop())
+            for conn in [conn for conn, owner in self._conns_inuse.items() if owner == ident]:
+                del self._conns_inuse[conn]
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def destroy(self):
+        with self._cond:
+            self.discard_idle()
+            for conn in self._conns_inuse:
+                conn.disconnect()
+
+    def stats(self):
+        with self._cond:
+            host, port = self.hosts[self._host_index]
+            stats = {
+                'host': '{}:{}'.format(host, port),
+                'max': self.max_conn,
+                'created': self._conns_created,
+                'in_use': len(self._conns_inuse),
+                'idle': len(self._conns_available),
+            }
+            stats.update(self._counters)
+            return stats
+
+
+class PooledStorageClient(Storage_client):
+    """
+    使用FdfsClient中保存的storage连接池，对象销毁时不关闭连接
+    """
+    def __init__(self, pool):
+        self.pool = pool
+
+    def __del__(self):
+        pass
+
+
+class FdfsClient(object):
+    """
+    代替fdfs_client的Fdfs_client，只实现项目中用到的方法，返回值相同
+    """
+    def __init__(self, conf_path, max_conn=10, wait_timeout=5, retry_times=1):
+        conf = read_client_conf(conf_path)
+        self.connect_timeout = conf['connect_timeout']
+        self.network_timeout = conf['network_timeout']
+        self.max_idle_time = conf['max_idle_time']
+        self.max_conn = max_conn
+        self.wait_timeout = wait_timeout
+        self.retry_times = retry_times
+        self.tracker_pool = self._make_pool('tracker', conf['trackers'])
+        self._storage_pools = {}
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'retries': 0, 'errors': 0}
+
+    def _make_pool(self, name, hosts):
+        return FdfsConnectionPool(name, hosts, self.connect_timeout, self.network_timeout, self.max_conn,
+                                  self.wait_timeout, self.max_idle_time)
+
+    def _storage_client(self, store_serv):
+        # store_serv.ip_addr是bytes
+        ip_addr = store_serv.ip_addr.decode() if isinstance(store_serv.ip_addr, bytes) else store_serv.ip_addr
+        key = '{}:{}'.format(ip_addr, store_serv.port)
+        with self._lock:
+            pool = self._storage_pools.get(key)
+            if pool is None:
+                pool = self._storage_pools[key] = self._make_pool('storage', [(ip_addr, store_serv.port)])
+        return PooledStorageClient(pool)
+
+    def _discard_idle(self):
+        self.tracker_pool.discard_idle()
+        with self._lock:
+            pools = list(self._storage_pools.values())
+        for pool in pools:
+            pool.discard_idle()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _call(self, name, func, retry=True):
+        """
+        :param retry: 请求失败时是否重试，追加文件时重试会重复写入数据，不能重试
+        """
+        self._count('requests')
+        attempts = self.retry_times + 1 if retry else 1
+        for attempt in range(attempts):
+            try:
+                return func(Tracker_client(self.tracker_pool))
+            except CONNECTION_ERRORS as e:
+                # 出错的连接可能已经放回连接池或者没有归还，全部关闭重新建立
+                self._discard_idle()
+                if attempt + 1 >= attempts:
+                    self._count('errors')
+                    raise
+                self._count('retries')
+                logger.warning('fastdfs {}请求异常，第{}次重试：{}'.format(name, attempt + 1, e))
+
+    def upload_by_buffer(self, filebuffer, file_ext_name=None, meta_dict=None):
+        if not filebuffer:
+            raise DataError('[-] Error: argument filebuffer can not be null.')
+
+        def upload(tc):
+            store_serv = tc.tracker_query_storage_stor_without_group()
+            return self._storage_client(store_serv).storage_upload_by_buffer(tc, store_serv, filebuffer,
+                                                                              file_ext_name, meta_dict)
+        return self._call('upload', upload)
+
+    def upload_appender_by_buffer(self, filebuffer, file_ext_name=None, meta_dict=None):
+        if not filebuffer:
+            raise DataError('[-] Error: argument filebuffer can not be null.')
+
+        def upload(tc):
+            store_serv = tc.tracker_query_storage_stor_without_group()
+            return self._storage_client(store_serv).storage_upload_appender_by_buffer(tc, store_serv, filebuffer,
+                                                                                       meta_dict, file_ext_name)
+        return self._call('upload_appender', upload)
+
+    def append_by_buffer(self, file_buffer, remote_fileid):
+        if not file_buffer:
+            raise DataError('[-] Error: file_buffer can not be null.')
+        tmp = split_remote_fileid(remote_fileid)
+        if not tmp:
+            raise DataError('[-] Error: remote_file_id is invalid.(append)')
+        group_name, appended_filename = tmp
+
+        def append(tc):
+            store_serv = tc.tracker_query_storage_update(group_name, appended_filename)
+            return self._storage_client(store_serv).storage_append_by_buffer(tc, store_serv, file_buffer,
+                                                                              appended_filename)
+        return self._call('append', append, retry=False)
+
+    def delete_file(self, remote_file_id):
+        tmp = split_remote_fileid(remote_file_id)
+        if not tmp:
+            raise DataError('[-] Error: remote_file_id is invalid.(in delete file)')
+        group_name, remote_filename = tmp
+
+        def delete(tc):
+            store_serv = tc.tracker_query_storage_update(group_name, remote_filename)
+            return self._storage_client(store_serv).storage_delete_file(tc, store_serv, remote_filename)
+        return self._call('delete', delete)
+
+    def download_to_buffer(self, remote_file_id):
+        tmp = split_remote_fileid(remote_file_id)
+        if not tmp:
+            raise DataError('[-] Error: remote_file_id is invalid.(in download file)')
+        group_name, remote_filename = tmp
+
+        def download(tc):
+            store_serv = tc.tracker_query_storage_fetch(group_name, remote_filename)
+            return self._storage_client(store_serv).storage_download_to_buffer(tc, store_serv, None, 0, 0,
+                                                                                remote_filename)
+        return self._call('download', download)
+
+    def file_exists(self, remote_file_id):
+        """
+        只下载第一个字节判断文件是否存在，文件不存在时tracker或storage返回错误状态（DataError）
+        """
+        tmp = split_remote_fileid(remote_file_id)
+        if not tmp:
+            return False
+        group_name, remote_filename = tmp
+
+        def download(tc):
+            store_serv = tc.tracker_query_storage_fetch(group_name, remote_filename)
+            return self._storage_client(store_serv).storage_download_to_buffer(tc, store_serv, None, 0, 1,
+                                                                                remote_filename)
+        try:
+            self._call('exists', download)
+        except DataError:
+            return False
+        return True
+
+    def stats(self):
+        """
+        :return: 当前进程的连接池统计
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            pools = dict(self._storage_pools)
+        stats['tracker'] = self.tracker_pool.stats()
+        stats['storage'] = {key: pool.stats() for key, pool in pools.items()}
+        return stats
+
+    def close(self):
+        self.tracker_pool.destroy()
+        with self._lock:
+            pools = list(self._storage_pools.values())
+        for pool in pools:
+            pool.destroy()
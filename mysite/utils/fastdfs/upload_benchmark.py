@@ -0,0 +1,104 @@
+'''
+上传内存占用测试：分别用 upload_by_buffer(file.read()) 和 upload_file_chunked 上传 1MB/50MB/75MB 的文件，
+每次在单独的子进程中执行，输出进程内存峰值(RSS)的增量
+
+在mysite目录下执行：
+    python -m utils.fastdfs.upload_benchmark          # 不连接fastdfs，只统计本进程的内存
+    python -m utils.fastdfs.upload_benchmark --real   # 上传到client.conf中配置的fastdfs
+'''
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from django.core.files import File
+
+SIZES_MB = (1, 50, 75)
+MODES = ('buffer', 'chunked')
+
+
+class DummyClient(object):
+    """
+    不连接fastdfs，只接收数据，用来单独统计上传过程的内存
+    """
+    def _result(self, buffer):
+        return {'Status': 'Upload successed.', 'Remote file_id': 'group1/M00/00/00/dummy',
+                'Uploaded size': len(buffer)}
+
+    def upload_by_buffer(self, buffer, file_ext_name=None):
+        return self._result(buffer)
+
+    def upload_appender_by_buffer(self, buffer, file_ext_name=None):
+        return self._result(buffer)
+
+    def append_by_buffer(self, buffer, remote_file_id):
+        return self._result(buffer)
+
+    def delete_file(self, remote_file_id):
+        pass
+
+
+def peak_rss_mb():
+    # linux下ru_maxrss的单位是KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_file(size_mb):
+    f = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+    block = os.urandom(1024 * 1024)
+    for _ in range(size_mb):
+        f.write(block)
+    f.close()
+    return f.name
+
+
+def run_one(mode, size_mb, real):
+    from utils.fastdfs import fdfs
+    if not real:
+        fdfs.get_fdfs_client = DummyClient
+
+    path = make_file(size_mb)
+    try:
+        base = peak_rss_mb()
+        with open(path, 'rb') as f:
+            # 和django的TemporaryUploadedFile一样，文件内容在磁盘上
+            upload = File(f, name=os.path.basename(path))
+            if mode == 'buffer':
+                upload_res = fdfs.get_fdfs_client().upload_by_buffer(upload.read(), file_ext_name='pdf')
+            else:
+                upload_res = fdfs.upload_file_chunked(upload, file_ext_name='pdf')
+        if upload_res.get('Status') != 'Upload successed.':
+            raise RuntimeError('上传失败：{}'.format(upload_res))
+        if real:
+            fdfs.get_fdfs_client().delete_file(upload_res['Remote file_id'].encode())
+        print('{:.1f}'.format(peak_rss_mb() - base))
+    finally:
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='fastdfs上传内存占用测试')
+    parser.add_argument('--real', action='store_true', help='上传到fastdfs，默认不连接fastdfs')
+    parser.add_argument('--run', nargs=2, metavar=('MODE', 'SIZE_MB'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_one(args.run[0], int(args.run[1]), args.real)
+        return
+
+    print('{:>8} {:>14} {:>14}'.format('size', 'buffer(MB)', 'chunked(MB)'))
+    for size_mb in SIZES_MB:
+        row = []
+        for mode in MODES:
+            # 内存峰值只增不减，每种情况在新的进程中测试
+            cmd = [sys.executable, '-m', 'utils.fastdfs.upload_benchmark', '--run', mode, str(size_mb)]
+            if args.real:
+                cmd.append('--real')
+            row.append(subprocess.check_output(cmd, universal_newlines=True).strip())
+        print('{:>6}MB {:>14} {:>14}'.format(size_mb, *row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+'''
+上传文件处理器：在接收上传数据的同时计算SHA-256，结果保存在上传文件对象的sha256属性中，
+上传到fastdfs前用来查询是否已经上传过相同的文件
+'''
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class Sha256UploadMixin(object):
+
+    def new_file(self, *args, **kwargs):
+        # 内存处理器的new_file会抛出StopFutureHandlers，先创建sha256对象
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        data = super().receive_data_chunk(raw_data, start)
+        if data is None:
+            # 返回None表示数据由当前处理器保存，没有交给下一个处理器
+            self.sha256.update(raw_data)
+        return data
+
+    def file_complete(self, file_size):
+        file_obj = super().file_complete(file_size)
+        if file_obj is not None:
+            file_obj.sha256 = self.sha256.hexdigest()
+        return file_obj
+
+
+class Sha256MemoryFileUploadHandler(Sha256UploadMixin, MemoryFileUploadHandler):
+    """
+    小于FILE_UPLOAD_MAX_MEMORY_SIZE的文件保存在内存中
+    """
+    pass
+
+
+class Sha256TemporaryFileUploadHandler(Sha256UploadMixin, TemporaryFileUploadHandler):
+    """
+    大文件保存在临时文件中
+    """
+    pass
@@ -1,3 +1,6 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.http import JsonResponse
 from utils.res_code import Code
 
@@ -11,4 +14,16 @@ def to_json_data(errno=Code.OK,errmsg='',data=None,**kwargs):
     # 判断是否存在，是否是字典，是都有值
     if kwargs and isinstance(kwargs,dict) and kwargs.keys():
         json_dict.update(kwargs)
-    return JsonResponse(json_dict)
\ No newline at end of file
+    return JsonResponse(json_dict)
+
+# 与to_json_data格式相同，返回编码后的bytes，用于缓存整个响应体
+def to_json_bytes(errno=Code.OK,errmsg='',data=None,**kwargs):
+    json_dict={
+        'errno':errno,
+        'errmsg':errmsg,
+        'data':data,
+    }
+    if kwargs and isinstance(kwargs,dict) and kwargs.keys():
+        json_dict.update(kwargs)
+    # 和JsonResponse使用相同的编码器
+    return json.dumps(json_dict,cls=DjangoJSONEncoder).encode('utf8')
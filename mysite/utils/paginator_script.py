@@ -1,3 +1,12 @@
+import base64
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+# 游标时间基准
+CURSOR_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
 def get_paginator_data(paginator, current_page, around_count=3):
     """
     :param paginator: 分页对象
@@ -36,4 +45,69 @@ def get_paginator_data(paginator, current_page, around_count=3):
         "right_has_more_page": right_has_more_page,
         "left_pages": left_page_range,
         "right_pages": right_page_range,
-    }
\ No newline at end of file
+    }
+
+
+def encode_cursor(update_time, pk):
+    """
+    把 (update_time, id) 编码成前端不透明的游标字符串
+    """
+    micros = (update_time - CURSOR_EPOCH) // timedelta(microseconds=1)
+    value = '{}:{}'.format(micros, pk).encode('utf8')
+    return base64.urlsafe_b64encode(value).decode('utf8').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    :return: (update_time, id)，游标格式不正确时抛出ValueError
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        micros, pk = base64.urlsafe_b64decode(padded.encode('utf8')).decode('utf8').split(':')
+        return CURSOR_EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except Exception as e:
+        raise ValueError('游标格式错误：{}'.format(cursor)) from e
+
+
+def get_seek_page(queryset, cursor, per_page):
+    """
+    键集分页，按 -update_time, -id 排序，从游标位置往后取一页
+    不需要COUNT和OFFSET，每页都是一次索引范围扫描
+    :param queryset: 查询集
+    :param cursor: 上一页返回的游标，为空时取第一页
+    :param per_page: 每页数据条数
+    :return: 当前页数据列表、下一页游标（没有更多数据时为None）
+    """
+    queryset = queryset.order_by('-update_time', '-id')
+    if cursor:
+        update_time, pk = decode_cursor(cursor)
+        # update_time <= t 为范围条件，再排除同一时间中已经返回过的数据
+        queryset = queryset.filter(update_time__lte=update_time).exclude(update_time=update_time, id__gte=pk)
+    # 多取一条判断是否还有下一页
+    items = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor(items[-1].update_time, items[-1].id)
+    return items, next_cursor
+
+
+class PrefilledPageList(object):
+    """
+    只包含某一页数据的序列，长度为总条数，用于从缓存中恢复分页
+    Paginator切片时直接返回这一页的数据
+    """
+    def __init__(self, count, offset, items):
+        self.total = count
+        self.offset = offset
+        self.items = items
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start = (index.start or 0) - self.offset
+            stop = (self.total if index.stop is None else index.stop) - self.offset
+            return self.items[max(start, 0):max(stop, 0)]
+        return self.items[index - self.offset]
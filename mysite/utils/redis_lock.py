@@ -0,0 +1,32 @@
+'''
+redis锁：加锁时写入随机token，释放时只删除自己的锁
+任务执行时间超过锁的有效期时，不会删除后面任务取得的锁
+'''
+import uuid
+from contextlib import contextmanager
+
+# 锁的值等于token时删除
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+@contextmanager
+def redis_lock(con_redis, key, expires):
+    """
+    with redis_lock(con_redis, key, expires) as locked:
+        if not locked:
+            return
+    :param expires: 锁的有效期，单位秒
+    :return: 是否取得锁
+    """
+    token = uuid.uuid4().hex
+    locked = con_redis.set(key, token, nx=True, ex=expires)
+    try:
+        yield bool(locked)
+    finally:
+        if locked:
+            con_redis.eval(RELEASE_LOCK_SCRIPT, 1, key, token)
@@ -0,0 +1,35 @@
+'''
+测试运行器：测试期间redis使用fakeredis，不需要连接redis服务器
+settings中 TEST_RUNNER = 'utils.test_runner.FakeRedisTestRunner'
+'''
+import fakeredis
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from django_redis.pool import ConnectionFactory
+
+
+class FakeRedisTestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # 所有redis缓存共用一个fakeredis服务器，不同的库和真实redis一样互不影响
+        server = fakeredis.FakeServer()
+        caches = {}
+        for alias, conf in settings.CACHES.items():
+            if conf['BACKEND'] == 'django_redis.cache.RedisCache':
+                options = dict(conf.get('OPTIONS', {}), CONNECTION_POOL_KWARGS={
+                    'connection_class': fakeredis.FakeConnection,
+                    'server': server,
+                })
+                conf = dict(conf, OPTIONS=options)
+            caches[alias] = conf
+        self._caches_override = override_settings(CACHES=caches)
+        self._caches_override.enable()
+        # django_redis按地址缓存连接池，去掉可能已经创建的真实连接池
+        ConnectionFactory._pools.clear()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches_override.disable()
+        ConnectionFactory._pools.clear()
+        super().teardown_test_environment(**kwargs)